@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import os
+import sys
+import time
+import tempfile
+from sqlalchemy import create_engine
+from dotenv import load_dotenv; load_dotenv('.env')
+
+from tableschema_sql import Storage
+
+
+# Benchmark of `reflect_catalog` against `MetaData.reflect`:
+#   python examples/reflect_catalog.py [tables] [database url]
+# (on SQLite the bulk inspection still runs catalog queries per table)
+
+# Engine
+tables = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+database_url = sys.argv[2] if len(sys.argv) > 2 else \
+    'sqlite:///%s' % os.path.join(tempfile.mkdtemp(), 'benchmark.db')
+engine = create_engine(database_url)
+
+# Create tables
+schema = {
+    'fields': [
+        {'name': 'id', 'type': 'integer'},
+        {'name': 'name', 'type': 'string'},
+        {'name': 'created', 'type': 'datetime'},
+    ],
+    'primaryKey': 'id',
+}
+storage = Storage(engine=engine, prefix='benchmark_')
+storage.delete()
+buckets = ['bucket%s' % number for number in range(tables)]
+storage.create(buckets, [schema] * tables, indexes_fields=[[['name']]] * tables)
+
+# Reflect and describe all buckets
+for reflect_catalog in [False, True]:
+    start = time.time()
+    storage = Storage(engine=engine, prefix='benchmark_', reflect_catalog=reflect_catalog)
+    for bucket in storage.buckets:
+        storage.describe(bucket)
+    print('reflect_catalog=%s: %.2fs' % (reflect_catalog, time.time() - start))
+
+# Delete tables
+storage.delete()
@@ -26,6 +26,8 @@ INSTALL_REQUIRES = [
     'pybloom_live>=2.2',
     'tabulator>=1.1',
     'tableschema>=1.0',
+    'isodate>=0.5',
+    'click>=6.0',
     'cryptography'
 ]
 TESTS_REQUIRE = [
@@ -53,6 +55,11 @@ setup(
     install_requires=INSTALL_REQUIRES,
     tests_require=TESTS_REQUIRE,
     extras_require={'develop': TESTS_REQUIRE},
+    entry_points={
+        'console_scripts': [
+            'tableschema-sql = tableschema_sql.cli:cli',
+        ]
+    },
     zip_safe=False,
     long_description=README,
     long_description_content_type='text/markdown',
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import sys
+import threading
+import collections
+
+
+# Module API
+
+class RowCache(object):
+
+    # Public
+
+    def __init__(self, size):
+        """LRU cache of restored rows within a memory budget in bytes
+
+        Entries are keyed by `(bucket, projection)` and stamped with a
+        staleness value compared on every lookup. Every invalidation bumps
+        a bucket version so rows read before it are not cached after it.
+        """
+        self.__size = size
+        self.__used = 0
+        self.__entries = collections.OrderedDict()
+        self.__versions = collections.defaultdict(int)
+        self.__version = 0
+        self.__lock = threading.Lock()
+
+    @property
+    def used(self):
+        """Approximate number of bytes used by cached rows
+        """
+        return self.__used
+
+    def get(self, key, stamp):
+        """Get cached rows or None if missing or stale
+        """
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] != stamp:
+                self.__remove(key)
+                return None
+            self.__entries.move_to_end(key)
+            return entry[1]
+
+    def get_version(self, bucket):
+        """Get the invalidation version of a bucket to be passed to `put`
+        """
+        with self.__lock:
+            return (self.__version, self.__versions[bucket])
+
+    def put(self, key, stamp, rows, version=None):
+        """Cache rows evicting the least recently used entries over the budget
+
+        With `version` rows are not cached if the bucket was invalidated since.
+        """
+        size = _get_size(rows)
+        with self.__lock:
+            if key in self.__entries:
+                self.__remove(key)
+            if version is not None and version != (self.__version, self.__versions[key[0]]):
+                return
+            if size > self.__size:
+                return
+            while self.__used + size > self.__size:
+                self.__remove(next(iter(self.__entries)))
+            self.__entries[key] = (stamp, rows, size)
+            self.__used += size
+
+    def invalidate(self, bucket=None):
+        """Remove cached rows of a bucket or all buckets
+        """
+        with self.__lock:
+            if bucket is None:
+                self.__version += 1
+            else:
+                self.__versions[bucket] += 1
+            for key in list(self.__entries):
+                if bucket is None or key[0] == bucket:
+                    self.__remove(key)
+
+    # Private
+
+    def __remove(self, key):
+        self.__used -= self.__entries.pop(key)[2]
+
+
+# Internal
+
+def _get_size(rows):
+    # Shallow estimate: containers and their direct values
+    size = sys.getsizeof(rows)
+    for row in rows:
+        size += sys.getsizeof(row)
+        for value in row:
+            size += sys.getsizeof(value)
+    return size
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import itertools
+import collections
+import tableschema
+from concurrent.futures import ProcessPoolExecutor
+from .mapper import Mapper
+
+
+# Module API
+
+class Caster(object):
+
+    # Public
+
+    def __init__(self, descriptor, fallbacks, prefix, dialect, workers, chunk_size):
+        """Caster to convert rows to SQL using a pool of processes
+        """
+        self.__descriptor = descriptor
+        self.__fallbacks = fallbacks
+        self.__prefix = prefix
+        self.__dialect = dialect
+        self.__workers = workers
+        self.__chunk_size = chunk_size
+
+    def cast(self, rows, keyed=False):
+        """Cast rows/keyed_rows yielding converted keyed rows in the input order
+        """
+        initargs = (self.__descriptor, self.__fallbacks, self.__prefix, self.__dialect)
+        with ProcessPoolExecutor(max_workers=self.__workers,
+                initializer=_initialize, initargs=initargs) as executor:
+            pending = collections.deque()
+            for start, chunk in self.__iter_chunks(rows):
+                pending.append(executor.submit(_cast_chunk, start, chunk, keyed))
+                # Keep a bounded number of chunks in flight
+                if len(pending) >= self.__workers * 2:
+                    for row in _get_result(pending.popleft()):
+                        yield row
+            while pending:
+                for row in _get_result(pending.popleft()):
+                    yield row
+
+    # Private
+
+    def __iter_chunks(self, rows):
+        rows = iter(rows)
+        start = 0
+        while True:
+            chunk = list(itertools.islice(rows, self.__chunk_size))
+            if not chunk:
+                break
+            yield start, chunk
+            start += len(chunk)
+
+
+# Internal
+
+_state = {}
+
+
+def _initialize(descriptor, fallbacks, prefix, dialect):
+    # Runs once per worker process
+    _state['schema'] = tableschema.Schema(descriptor)
+    _state['fallbacks'] = fallbacks
+    _state['mapper'] = Mapper(prefix=prefix, dialect=dialect)
+
+
+def _cast_chunk(start, rows, keyed):
+    schema = _state['schema']
+    fallbacks = _state['fallbacks']
+    mapper = _state['mapper']
+    result = []
+    for index, row in enumerate(rows, start=start):
+        try:
+            keyed_row = row
+            if not keyed:
+                keyed_row = dict(zip(schema.field_names, row))
+            result.append(mapper.convert_row(keyed_row, schema=schema, fallbacks=fallbacks))
+        except Exception as exception:
+            # Exceptions are reported as data to avoid pickling problems
+            return (False, index, str(exception))
+    return (True, None, result)
+
+
+def _get_result(future):
+    success, index, result = future.result()
+    if not success:
+        message = 'Cannot cast row %s: %s' % (index, result)
+        exception = tableschema.exceptions.CastError(message)
+        exception.row_index = index
+        raise exception
+    return result
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import sqlalchemy as sa
+
+
+# Module API
+
+def reflect(connection, metadata, only):
+    """Reflect tables with only columns, primary and foreign keys
+
+    Tables are fetched with a few bulk catalog queries per batch of tables
+    instead of inspecting every table (indexes and other constraints
+    are not reflected). Referred tables are reflected too. The SQLite
+    dialect implements bulk inspection with PRAGMA queries per table.
+    """
+    inspector = sa.inspect(connection)
+    if not hasattr(inspector, 'get_multi_columns'):
+        # SQLAlchemy < 2.0 doesn't have bulk inspection
+        metadata.reflect(only=only, bind=connection)
+        return
+    schema = metadata.schema
+    names = [name for name in inspector.get_table_names(schema=schema)
+        if only(name, metadata) and _get_key(schema, name) not in metadata.tables]
+    while names:
+        columns = inspector.get_multi_columns(schema=schema, filter_names=names)
+        pks = inspector.get_multi_pk_constraint(schema=schema, filter_names=names)
+        fks = inspector.get_multi_foreign_keys(schema=schema, filter_names=names)
+        referred = set()
+        for name in names:
+            key = (schema, name)
+            table = sa.Table(name, metadata, schema=schema)
+            for column in columns.get(key, []):
+                # Column types can be changed by `column_reflect` listeners
+                metadata.dispatch.column_reflect(inspector, table, column)
+                table.append_column(_get_column(column))
+            pk = pks.get(key) or {}
+            if pk.get('constrained_columns'):
+                table.append_constraint(sa.PrimaryKeyConstraint(
+                    *pk['constrained_columns'], name=pk.get('name')))
+            for fk in fks.get(key, []):
+                referred_schema = fk['referred_schema'] or schema
+                table.append_constraint(sa.ForeignKeyConstraint(
+                    fk['constrained_columns'],
+                    ['%s.%s' % (_get_key(referred_schema, fk['referred_table']), column)
+                        for column in fk['referred_columns']],
+                    name=fk.get('name'), **fk.get('options', {})))
+                if referred_schema == schema:
+                    referred.add(fk['referred_table'])
+                elif _get_key(referred_schema, fk['referred_table']) not in metadata.tables:
+                    sa.Table(fk['referred_table'], metadata,
+                        schema=referred_schema, autoload_with=connection)
+        names = sorted(name for name in referred
+            if _get_key(schema, name) not in metadata.tables)
+
+
+# Internal
+
+def _get_key(schema, name):
+    return '%s.%s' % (schema, name) if schema else name
+
+
+def _get_column(column):
+    options = {
+        'nullable': column['nullable'],
+        'autoincrement': column.get('autoincrement', 'auto'),
+        'comment': column.get('comment'),
+    }
+    if column.get('default') is not None:
+        options['server_default'] = sa.text(column['default'])
+    return sa.Column(column['name'], column['type'], **options)
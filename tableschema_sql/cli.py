@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import io
+import os
+import sys
+import json
+import time
+import click
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import create_engine
+from .storage import Storage
+
+
+# Module API
+
+@click.group(help='Load, dump and inspect Table Schema buckets in SQL databases.')
+def cli():
+    """Command-line interface
+
+    ```
+    Usage: tableschema-sql [OPTIONS] COMMAND [ARGS]...
+
+      Load, dump and inspect Table Schema buckets in SQL databases.
+
+    Options:
+      --help  Show this message and exit.
+
+    Commands:
+      describe  Describe a bucket.
+      dump      Dump buckets to files.
+      list      List buckets.
+      load      Load tabular files to buckets.
+    ```
+
+    """
+    pass
+
+
+@cli.command(name='list')
+@click.argument('url')
+@click.option('--prefix', default='')
+@click.option('--dbschema')
+def list_(url, prefix, dbschema):
+    """List buckets."""
+    storage = _get_storage(url, prefix, dbschema)
+    for bucket in storage.buckets:
+        click.echo(bucket)
+
+
+@cli.command()
+@click.argument('url')
+@click.argument('bucket')
+@click.option('--prefix', default='')
+@click.option('--dbschema')
+def describe(url, bucket, prefix, dbschema):
+    """Describe a bucket."""
+    storage = _get_storage(url, prefix, dbschema)
+    descriptor = storage.describe(bucket)
+    click.echo(json.dumps(descriptor, ensure_ascii=False, indent=4))
+
+
+@cli.command()
+@click.argument('url')
+@click.argument('sources', nargs=-1, required=True)
+@click.option('--prefix', default='')
+@click.option('--dbschema')
+@click.option('--force', is_flag=True, help='Replace existing buckets.')
+@click.option('--infer-sample', default=100, type=int)
+@click.option('--batch-size', default=1000, type=int)
+@click.option('--workers', default=1, type=int, help='Number of files loaded in parallel.')
+def load(url, sources, prefix, dbschema, force, infer_sample, batch_size, workers):
+    """Load tabular files to buckets.
+
+    Every source is loaded to a bucket named after the file name without extension.
+
+    """
+    reporter = _Reporter('Loaded')
+
+    def task(source):
+        bucket = os.path.splitext(os.path.basename(source))[0]
+        storage = _get_storage(url, prefix, dbschema)
+        started = time.time()
+        count = storage.import_source(bucket, source,
+            infer_sample=infer_sample, force=force, buffer_size=batch_size,
+            post_parse=[reporter.counter()])
+        reporter.done(bucket, count, time.time() - started)
+
+    _run(task, sources, workers, reporter)
+
+
+@cli.command()
+@click.argument('url')
+@click.argument('directory')
+@click.option('--bucket', 'buckets', multiple=True, help='Bucket to dump (defaults to all).')
+@click.option('--prefix', default='')
+@click.option('--dbschema')
+@click.option('--format', default='csv', type=click.Choice(['csv', 'ndjson']))
+@click.option('--copy', is_flag=True, help='Use COPY on PostgreSQL (only for CSV).')
+@click.option('--batch-size', default=1000, type=int)
+@click.option('--workers', default=1, type=int, help='Number of buckets dumped in parallel.')
+def dump(url, directory, buckets, prefix, dbschema, format, copy, batch_size, workers):
+    """Dump buckets to files.
+
+    Every bucket is written to `<directory>/<bucket>.<format>`.
+
+    """
+    reporter = _Reporter('Dumped')
+    buckets = buckets or _get_storage(url, prefix, dbschema).buckets
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+
+    def task(bucket):
+        storage = _get_storage(url, prefix, dbschema)
+        started = time.time()
+        path = os.path.join(directory, '%s.%s' % (bucket, format))
+        with io.open(path, 'w', newline='', encoding='utf-8') as file:
+            count = storage.export(bucket, file,
+                format=format, batch_size=batch_size, copy=copy, on_batch=reporter.add)
+        reporter.done(bucket, count, time.time() - started)
+
+    _run(task, buckets, workers, reporter)
+
+
+# Internal
+
+def _get_storage(url, prefix, dbschema):
+    engine = create_engine(url)
+    return Storage(engine, dbschema=dbschema, prefix=prefix)
+
+
+def _run(task, items, workers, reporter):
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for future in [executor.submit(task, item) for item in items]:
+                future.result()
+    except Exception as exception:
+        reporter.stop()
+        click.echo(exception, err=True)
+        sys.exit(1)
+    reporter.stop()
+    reporter.summary()
+
+
+class _Reporter(object):
+    """Thread-safe rows counter printing live throughput to stderr
+    """
+
+    def __init__(self, action, interval=1):
+        self.__action = action
+        self.__interval = interval
+        self.__rows = 0
+        self.__lock = threading.Lock()
+        self.__started = time.time()
+        self.__stopped = threading.Event()
+        self.__thread = threading.Thread(target=self.__report)
+        self.__thread.daemon = True
+        self.__thread.start()
+
+    def add(self, count):
+        with self.__lock:
+            self.__rows += count
+
+    def counter(self):
+        """Get a `tabulator` post parse processor counting rows
+
+        The stream sample is parsed twice so only new row numbers are counted.
+        """
+        state = {'last': 0}
+
+        def processor(extended_rows):
+            for row_number, headers, row in extended_rows:
+                if row_number > state['last']:
+                    state['last'] = row_number
+                    with self.__lock:
+                        self.__rows += 1
+                yield (row_number, headers, row)
+
+        return processor
+
+    def done(self, name, count, elapsed):
+        message = '%s "%s": %s rows in %.2fs (%.0f rows/s)'
+        click.echo(message % (self.__action, name, count, elapsed, _rate(count, elapsed)), err=True)
+
+    def stop(self):
+        self.__stopped.set()
+        self.__thread.join()
+
+    def summary(self):
+        elapsed = time.time() - self.__started
+        message = '%s %s rows in %.2fs (%.0f rows/s)'
+        click.echo(message % (self.__action, self.__rows, elapsed, _rate(self.__rows, elapsed)))
+
+    def __report(self):
+        while not self.__stopped.wait(self.__interval):
+            elapsed = time.time() - self.__started
+            message = '%s rows, %.0f rows/s' % (self.__rows, _rate(self.__rows, elapsed))
+            click.echo(message, err=True)
+
+
+def _rate(count, elapsed):
+    return count / elapsed if elapsed else 0
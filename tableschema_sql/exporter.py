@@ -0,0 +1,224 @@
+# -*- coding: utf-8 -*-
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import io
+import csv
+import json
+import math
+import datetime
+import isodate
+import tableschema
+from .helpers import connect
+
+
+# Module API
+
+class Exporter(object):
+
+    # Public
+
+    def __init__(self, engine, table, schema, format, batch_size):
+        """Exporter to stream table rows to a file object
+        """
+        if format not in ['csv', 'ndjson']:
+            message = 'Export format "%s" is not supported' % format
+            raise tableschema.exceptions.StorageError(message)
+        self.__engine = engine
+        self.__table = table
+        self.__schema = schema
+        self.__format = format
+        self.__batch_size = batch_size
+
+    def export(self, fileobj, on_batch=None):
+        """Export rows using serializers chosen once per column
+
+        With `on_batch` the number of rows of every written batch is reported.
+        """
+        count = 0
+        columns = [getattr(self.__table.c, name) for name in self.__schema.field_names]
+        select = self.__table.select().with_only_columns(*columns)
+        select = select.execution_options(stream_results=True, yield_per=self.__batch_size)
+        serialize = self.__get_batch_serializer()
+        with connect(self.__engine) as connection:
+            result = connection.execute(select)
+            if self.__format == 'csv':
+                csv.writer(fileobj, lineterminator='\n').writerow(self.__schema.field_names)
+            for batch in result.partitions(self.__batch_size):
+                fileobj.write(serialize(batch))
+                count += len(batch)
+                if on_batch is not None:
+                    on_batch(len(batch))
+        return count
+
+    def export_copy(self, fileobj):
+        """Export rows using PostgreSQL `COPY ... TO STDOUT`
+
+        Values are written in their PostgreSQL text representation.
+        """
+        if self.__engine.dialect.driver != 'psycopg2' or self.__format != 'csv':
+            message = 'COPY export is only supported for CSV on PostgreSQL (psycopg2)'
+            raise tableschema.exceptions.StorageError(message)
+        preparer = self.__engine.dialect.identifier_preparer
+        names = ', '.join(preparer.quote(name) for name in self.__schema.field_names)
+        sql = 'COPY (SELECT %s FROM %s) TO STDOUT WITH CSV HEADER' % (
+            names, preparer.format_table(self.__table))
+        with connect(self.__engine) as connection:
+            cursor = connection.connection.cursor()
+            try:
+                cursor.copy_expert(sql, fileobj)
+                return cursor.rowcount
+            finally:
+                cursor.close()
+
+    # Private
+
+    def __get_batch_serializer(self):
+        fields = self.__schema.fields
+
+        # CSV
+        if self.__format == 'csv':
+            serializers = [_get_csv_serializer(field) for field in fields]
+            def serialize(batch):
+                buffer = io.StringIO()
+                writer = csv.writer(buffer, lineterminator='\n')
+                for row in batch:
+                    writer.writerow([None if value is None else serializer(value)
+                        for serializer, value in zip(serializers, row)])
+                return buffer.getvalue()
+            return serialize
+
+        # NDJSON
+        serializers = [_get_json_serializer(field) for field in fields]
+        names = [json.dumps(field.name) + ': ' for field in fields]
+        def serialize(batch):
+            lines = []
+            for row in batch:
+                lines.append('{%s}\n' % ', '.join(
+                    name + ('null' if value is None else serializer(value))
+                    for name, serializer, value in zip(names, serializers, row)))
+            return ''.join(lines)
+        return serialize
+
+
+# Internal
+
+def _serialize_text(value):
+    if isinstance(value, (list, dict)):
+        return json.dumps(value)
+    return str(value)
+
+
+def _serialize_json(value):
+    if isinstance(value, (list, dict)):
+        return json.dumps(value)
+    return json.dumps(str(value))
+
+
+def _serialize_boolean(value):
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    return str(value)
+
+
+def _serialize_datetime(value):
+    if isinstance(value, datetime.datetime) and value.tzinfo is None:
+        if value.microsecond:
+            return value.isoformat() + 'Z'
+        return value.strftime('%Y-%m-%dT%H:%M:%SZ')
+    return _serialize_temporal(value)
+
+
+def _serialize_temporal(value):
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    return str(value)
+
+
+def _serialize_number(value):
+    try:
+        if not isinstance(value, bool) and math.isfinite(value):
+            return str(value)
+    except TypeError:
+        pass
+    return json.dumps(str(value))
+
+
+def _serialize_compound(value):
+    # Text fallback columns keep JSON documents as strings
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except ValueError:
+            pass
+    return json.dumps(value)
+
+
+def _serialize_duration(value):
+    if isinstance(value, (datetime.timedelta, isodate.Duration)):
+        return isodate.duration_isoformat(value)
+    return str(value)
+
+
+def _serialize_yearmonth(value):
+    # Native columns keep yearmonth packed as `year * 100 + month`
+    if isinstance(value, int):
+        value = divmod(value, 100)
+    if isinstance(value, (list, tuple)):
+        return '%04d-%02d' % tuple(value)
+    return str(value)
+
+
+def _get_geopoint_serializer(field):
+    # Native columns keep geopoint as a `[lon, lat]` array
+    templates = {'array': '[%s, %s]', 'object': '{"lon": %s, "lat": %s}'}
+    template = templates.get(field.format, '%s,%s')
+    def serialize(value):
+        if isinstance(value, (list, tuple)):
+            return template % tuple(value)
+        return str(value)
+    return serialize
+
+
+def _get_temporal_serializer(field):
+    # Custom formats are kept to allow casting exported values back
+    format = field.format.replace('fmt:', '')
+    if format not in ['default', 'any']:
+        def serialize(value):
+            if isinstance(value, (datetime.date, datetime.time)):
+                return value.strftime(format)
+            return str(value)
+        return serialize
+    if field.type == 'datetime':
+        return _serialize_datetime
+    return _serialize_temporal
+
+
+def _get_csv_serializer(field):
+    if field.type in ['date', 'datetime', 'time']:
+        return _get_temporal_serializer(field)
+    if field.type == 'boolean':
+        return _serialize_boolean
+    if field.type == 'duration':
+        return _serialize_duration
+    if field.type == 'yearmonth':
+        return _serialize_yearmonth
+    if field.type == 'geopoint':
+        return _get_geopoint_serializer(field)
+    return _serialize_text
+
+
+def _get_json_serializer(field):
+    if field.type in ['date', 'datetime', 'time', 'duration', 'yearmonth', 'geopoint']:
+        serialize = _get_csv_serializer(field)
+        return lambda value: json.dumps(serialize(value))
+    if field.type == 'boolean':
+        return lambda value: _serialize_boolean(value) \
+            if isinstance(value, bool) else json.dumps(str(value))
+    if field.type in ['integer', 'number', 'year']:
+        return _serialize_number
+    if field.type in ['array', 'geojson', 'object']:
+        return _serialize_compound
+    return _serialize_json
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import contextlib
+import sqlalchemy as sa
+
+
+# Module API
+
+@contextlib.contextmanager
+def connect(bind):
+    """Connect to an engine or reuse a session connection
+    """
+    if isinstance(bind, sa.engine.Connection):
+        yield bind
+    else:
+        with bind.connect() as connection:
+            yield connection
+
+
+@contextlib.contextmanager
+def begin(connection):
+    """Begin a transaction or join the one already in progress
+    """
+    if connection.in_transaction():
+        yield
+    else:
+        with connection.begin():
+            yield
+
+
+@contextlib.contextmanager
+def begin_ddl(connection):
+    """Begin a transaction for DDL statements or join the one already in progress
+
+    The pysqlite driver doesn't begin transactions before DDL statements
+    (they would be committed one by one) so SQLite transactions are begun explicitly.
+    """
+    with begin(connection):
+        if connection.dialect.name == 'sqlite':
+            if not connection.connection.dbapi_connection.in_transaction:
+                connection.exec_driver_sql('BEGIN')
+        yield
+
+
+@contextlib.contextmanager
+def begin_restartable(connection):
+    """Begin a transaction yielding a function to commit it and begin the next one
+    """
+    transaction = [connection.begin()]
+    def commit():
+        transaction[0].commit()
+        transaction[0] = connection.begin()
+    try:
+        yield commit
+    except BaseException:
+        transaction[0].rollback()
+        raise
+    transaction[0].commit()
@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from six.moves import queue
+from .writer import Writer, WrittenCounts
+from .helpers import connect, begin
+
+
+# Module API
+
+class ParallelWriter(object):
+
+    # Public
+
+    def __init__(self, engine, create_writer, schema, convert_row, update_keys,
+                 buffer_size, workers, partitioner=None, twophase=False, bloom_table=None):
+        """Writer sharding rows over writers on their own pooled connections
+
+        Rows are converted once and sent in batches to a bounded queue per
+        writer; with `update_keys` rows are sharded by key (so all rows of a key
+        are written in order by the same writer), otherwise batches are sent
+        round robin. Every writer commits its shard unless `twophase` is used
+        to commit all of them or none with a two-phase commit. With `bloom_table`
+        the table is scanned once for a bloom filter of existing keys per shard
+        which is passed to `create_writer` as `bloom`.
+        """
+        self.__engine = engine
+        self.__create_writer = create_writer
+        self.__schema = schema
+        self.__convert_row = convert_row
+        self.__update_keys = update_keys
+        self.__buffer_size = buffer_size
+        self.__workers = workers
+        self.__partitioner = partitioner
+        self.__twophase = twophase
+        self.__bloom_table = bloom_table
+
+    def write(self, rows, keyed=False):
+        """Write rows/keyed_rows returning aggregated `WrittenCounts`
+        """
+        self.__failed = threading.Event()
+        self.__transactions = []
+        queues = [queue.Queue(maxsize=2) for _ in range(self.__workers)]
+        blooms = [None] * self.__workers
+        if self.__bloom_table is not None and self.__update_keys is not None:
+            blooms = Writer.prepare_blooms(self.__engine, self.__bloom_table,
+                self.__update_keys, self.__workers, self.__get_index)
+        try:
+            with ThreadPoolExecutor(max_workers=self.__workers) as executor:
+                futures = [executor.submit(self.__drain, rows_queue, bloom)
+                    for rows_queue, bloom in zip(queues, blooms)]
+                end = _ABORT
+                try:
+                    for index, batch in self.__iter_batches(rows, keyed):
+                        if self.__failed.is_set():
+                            break
+                        # Partitions known to exist don't need a connection
+                        partitioner = self.__partitioner
+                        if partitioner is not None and partitioner.is_missing(batch):
+                            with connect(self.__engine) as connection:
+                                with begin(connection):
+                                    partitioner.ensure(connection, batch)
+                        queues[index].put(batch)
+                    end = None
+                finally:
+                    for rows_queue in queues:
+                        rows_queue.put(end)
+                counts = [future.result() for future in futures]
+            for connection, transaction in self.__transactions:
+                transaction.prepare()
+            for connection, transaction in self.__transactions:
+                transaction.commit()
+        except Exception:
+            for connection, transaction in self.__transactions:
+                if transaction.is_active:
+                    transaction.rollback()
+            raise
+        finally:
+            for connection, transaction in self.__transactions:
+                connection.close()
+        return WrittenCounts(*[sum(values) for values in zip(*counts)])
+
+    # Private
+
+    def __iter_batches(self, rows, keyed):
+        """Yield `(writer index, batch)` of converted keyed rows
+        """
+        names = self.__schema.field_names
+        keyed_rows = iter(rows)
+        if not keyed:
+            keyed_rows = (dict(zip(names, row)) for row in keyed_rows)
+        keyed_rows = (self.__convert_row(keyed_row) for keyed_row in keyed_rows)
+
+        # Round robin
+        if self.__update_keys is None:
+            for index in itertools.cycle(range(self.__workers)):
+                batch = list(itertools.islice(keyed_rows, self.__buffer_size))
+                if not batch:
+                    break
+                yield index, batch
+            return
+
+        # Sharded by key
+        batches = [[] for _ in range(self.__workers)]
+        for keyed_row in keyed_rows:
+            index = self.__get_index(tuple(keyed_row[name] for name in self.__update_keys))
+            batches[index].append(keyed_row)
+            if len(batches[index]) >= self.__buffer_size:
+                yield index, batches[index]
+                batches[index] = []
+        for index, batch in enumerate(batches):
+            if batch:
+                yield index, batch
+
+    def __get_index(self, key):
+        return hash(key) % self.__workers
+
+    def __drain(self, rows_queue, bloom):
+        """Write batches from a queue returning counts (runs in a thread)
+        """
+        ended = []
+        def iter_rows():
+            while True:
+                batch = rows_queue.get()
+                if batch is None or batch is _ABORT:
+                    ended.append(True)
+                    if batch is _ABORT:
+                        raise RuntimeError('Parallel write is aborted')
+                    return
+                for keyed_row in batch:
+                    yield keyed_row
+        try:
+            bind = self.__engine
+            if self.__twophase:
+                bind = self.__engine.connect()
+                self.__transactions.append((bind, bind.begin_twophase()))
+            writer = self.__create_writer(bind, bloom=bloom)
+            return next(writer.write(iter_rows(), keyed=True, results='counts'))
+        except Exception:
+            # Unblock the producer
+            self.__failed.set()
+            while not ended:
+                if rows_queue.get() in [None, _ABORT]:
+                    break
+            raise
+
+
+# Internal
+
+_ABORT = object()
@@ -5,12 +5,16 @@ from __future__ import print_function
 from __future__ import unicode_literals
 
 import json
+import decimal
+import datetime
+from functools import partial
 
 import six
+import isodate
 import tableschema
 import sqlalchemy as sa
 from sqlalchemy import CheckConstraint as Check
-from sqlalchemy.dialects.postgresql import ARRAY, JSON, JSONB, UUID
+from sqlalchemy.ext.compiler import compiles
 
 
 # Module API
@@ -24,6 +28,10 @@ class Mapper(object):
         """
         self.__prefix = prefix
         self.__dialect = dialect
+        self.__packers = _get_packers(dialect)
+        self.__unpackers = _get_unpackers(dialect)
+        self.__restore_types = _get_restore_types(dialect)
+        self.__restored_types = {}
 
     def convert_bucket(self, bucket):
         """Convert bucket to SQL
@@ -57,6 +65,9 @@ class Mapper(object):
                 fallbacks.append(field.name)
             nullable = not field.required
             comment = _get_field_comment(field)
+            if isinstance(column_type, _MarkedType):
+                # Field type is restored from the marker on reflection
+                comment = _add_type_marker(comment, field.type)
             unique = field.constraints.get('unique', False)
             checks = []
             for name, value in field.constraints.items():
@@ -117,14 +128,54 @@ class Mapper(object):
                 constraints.append(constraint)
 
         # Indexes
-        if self.__dialect in ('postgresql', 'sqlite'):
-            for index, index_definition in enumerate(index_fields):
-                name = table_name + '_ix%03d' % index
-                index_columns = [column_mapping[field] for field in index_definition]
-                indexes.append(sa.Index(name, *index_columns))
+        for index, index_definition in enumerate(index_fields):
+            index = self.convert_index(table_name, index, index_definition, column_mapping)
+            if index is not None:
+                indexes.append(index)
 
         return columns, constraints, indexes, fallbacks, comment
 
+    def convert_index(self, table_name, index, definition, column_mapping):
+        """Convert index definition to SQL
+
+        A definition is a list of field names or a dict with `fields` and
+        optional `name`, `unique`, `using`, `where` and `include` keys.
+        Options not supported by the dialect are ignored; partial indexes
+        are skipped on MySQL as they can't be expressed there.
+        """
+        if not isinstance(definition, dict):
+            definition = {'fields': definition}
+        unknown = set(definition) - set(['fields', 'name', 'unique', 'using', 'where', 'include'])
+        if unknown or not definition.get('fields'):
+            message = 'Index definition "%s" is not valid'
+            raise tableschema.exceptions.StorageError(message % definition)
+        name = definition.get('name', table_name + '_ix%03d' % index)
+        columns = [column_mapping[field] for field in definition['fields']]
+        options = {'unique': definition.get('unique', False)}
+        using = definition.get('using')
+        where = definition.get('where')
+        include = definition.get('include')
+        if self.__dialect == 'postgresql':
+            if using:
+                options['postgresql_using'] = using
+            if where:
+                options['postgresql_where'] = sa.text(where)
+            if include:
+                options['postgresql_include'] = include
+        elif self.__dialect == 'sqlite':
+            if where:
+                options['sqlite_where'] = sa.text(where)
+        elif self.__dialect == 'mysql':
+            if where:
+                return None
+            if using in ['btree', 'hash']:
+                options['mysql_using'] = using
+            # Text columns can only be indexed by a prefix
+            lengths = {column.name: 255 for column in columns if isinstance(column.type, sa.Text)}
+            if lengths:
+                options['mysql_length'] = lengths
+        return sa.Index(name, *columns, **options)
+
     def convert_row(self, keyed_row, schema, fallbacks):
         """Convert row to SQL
         """
@@ -136,9 +187,57 @@ class Mapper(object):
                 value = _uncast_value(value, field=field)
             else:
                 value = field.cast_value(value)
+                packer = self.__packers.get(field.type)
+                if packer and value is not None:
+                    value = packer(value)
             keyed_row[key] = value
         return keyed_row
 
+    def get_typed_row_converter(self, schema, fallbacks, trust=False):
+        """Get a function converting rows of typed Python values to SQL without casting
+
+        Values are only checked to be instances of the field type's Python
+        types (not checked at all with `trust`). Per-field work is prepared once.
+        """
+        converters = {}
+        for field in schema.fields:
+            if field.name in fallbacks:
+                converters[field.name] = partial(_uncast_typed_value, field=field)
+                continue
+            packer = self.__packers.get(field.type)
+            if trust:
+                converters[field.name] = packer
+                continue
+            converters[field.name] = partial(_check_typed_value, field=field, packer=packer)
+
+        def convert(keyed_row):
+            for key, value in list(keyed_row.items()):
+                if key not in converters:
+                    del keyed_row[key]
+                    continue
+                converter = converters[key]
+                if converter is not None and value is not None:
+                    keyed_row[key] = converter(value)
+            return keyed_row
+
+        return convert
+
+    def convert_values(self, values, schema, fallbacks):
+        """Convert positional row to SQL
+        """
+        result = []
+        for index, field in enumerate(schema.fields):
+            value = values[index] if index < len(values) else None
+            if field.name in fallbacks:
+                value = _uncast_value(value, field=field)
+            else:
+                value = field.cast_value(value)
+                packer = self.__packers.get(field.type)
+                if packer and value is not None:
+                    value = packer(value)
+            result.append(value)
+        return result
+
     def convert_type(self, type):
         """Convert type to SQL
         """
@@ -162,13 +261,27 @@ class Mapper(object):
             'yearmonth': None,
         }
 
-        # Postgresql dialect
+        # Postgresql dialect (types are imported on first use)
         if self.__dialect == 'postgresql':
+            from sqlalchemy.dialects.postgresql import JSONB
             mapping.update({
                 'array': JSONB,
+                'duration': _Duration(),
                 'geojson': JSONB,
+                'geopoint': _GeoPoint(),
                 'number': sa.Numeric,
                 'object': JSONB,
+                'yearmonth': _YearMonth(),
+            })
+
+        # Sqlite/Mysql dialects
+        if self.__dialect in ['sqlite', 'mysql']:
+            mapping.update({
+                'array': sa.JSON(none_as_null=True),
+                'geojson': sa.JSON(none_as_null=True),
+                'geopoint': _GeoPoint(),
+                'object': sa.JSON(none_as_null=True),
+                'yearmonth': _YearMonth(),
             })
 
         # Not supported type
@@ -178,6 +291,28 @@ class Mapper(object):
 
         return mapping[type]
 
+    def restore_column(self, column_info):
+        """Restore marked column type of a reflected column
+
+        It's a `column_reflect` listener body: the type of a column with a type
+        marker in its comment is replaced by the type the field was created with.
+        """
+        field_type = _get_type_marker(column_info.get('comment'))
+        if field_type is not None:
+            column_type = self.convert_type(field_type)
+            if isinstance(column_type, _MarkedType):
+                column_info['type'] = column_type
+
+    def get_declared_types(self):
+        """Get types of declared type names to restore on reflection
+
+        SQLite doesn't keep column comments, so marked types are
+        created there with their own declared type names instead.
+        """
+        if self.__dialect != 'sqlite':
+            return {}
+        return dict((type.declared_name, type) for type in [_GeoPoint, _YearMonth])
+
     def restore_bucket(self, table_name):
         """Restore bucket from SQL
         """
@@ -242,54 +377,260 @@ class Mapper(object):
 
         return descriptor
 
+    def restore_indexes(self, indexes):
+        """Restore index definitions from SQL
+        """
+        definitions = []
+        for index in sorted(indexes, key=lambda index: index.name):
+            options = index.dialect_kwargs
+            fields = [column.name for column in index.columns]
+            if not fields:
+                # Expression indexes are not supported
+                continue
+            definition = {'fields': fields, 'name': index.name}
+            if index.unique:
+                definition['unique'] = True
+            using = options.get('postgresql_using') or options.get('mysql_using')
+            if using and using.lower() != 'btree':
+                definition['using'] = using
+            where = options.get('postgresql_where')
+            if where is None:
+                where = options.get('sqlite_where')
+            if where is not None:
+                definition['where'] = str(where)
+            if options.get('postgresql_include'):
+                definition['include'] = list(options['postgresql_include'])
+            definitions.append(definition)
+        return definitions
+
     def restore_row(self, row, schema, autoincrement):
         """Restore row from SQL
         """
         row = list(row)
         for index, field in enumerate(schema.fields, start=1 if autoincrement else 0):
-            if self.__dialect == 'postgresql':
-                if field.type in ['array', 'object']:
+            value = row[index]
+            if field.type in ['array', 'object']:
+                if self.__dialect == 'postgresql' or isinstance(value, (list, dict)):
                     continue
-            row[index] = field.cast_value(row[index])
+            unpacker = self.__unpackers.get(field.type)
+            if unpacker:
+                value = unpacker(value)
+            row[index] = field.cast_value(value)
         return row
 
     def restore_type(self, type):
         """Restore type from SQL
+
+        Field types are resolved once per type class and then looked up.
         """
+        field_type = self.__restored_types.get(type.__class__)
+        if field_type is None:
 
-        # All dialects
-        mapping = {
-            ARRAY: 'array',
-            sa.Boolean: 'boolean',
-            sa.Date: 'date',
-            sa.DateTime: 'datetime',
-            sa.Float: 'number',
-            sa.Integer: 'integer',
-            JSONB: 'object',
-            JSON: 'object',
-            sa.Numeric: 'number',
-            sa.Text: 'string',
-            sa.Time: 'time',
-            sa.VARCHAR: 'string',
-            UUID: 'string',
-        }
+            # Get field type (the last matching type wins)
+            for key, value in self.__restore_types:
+                if isinstance(type, key):
+                    field_type = value
 
-        # Get field type
-        field_type = None
-        for key, value in mapping.items():
-            if isinstance(type, key):
-                field_type = value
+            # Not supported
+            if field_type is None:
+                message = 'Type "%s" is not supported'
+                raise tableschema.exceptions.StorageError(message % type)
 
-        # Not supported
-        if field_type is None:
-            message = 'Type "%s" is not supported'
-            raise tableschema.exceptions.StorageError(message % type)
+            self.__restored_types[type.__class__] = field_type
 
         return field_type
 
 
 # Internal
 
+def _get_restore_types(dialect):
+
+    # All dialects
+    mapping = [
+        (sa.Boolean, 'boolean'),
+        (sa.Date, 'date'),
+        (sa.DateTime, 'datetime'),
+        (sa.Float, 'number'),
+        (sa.Integer, 'integer'),
+        (sa.Interval, 'duration'),
+        (sa.JSON, 'object'),
+        (sa.Numeric, 'number'),
+        (sa.Text, 'string'),
+        (sa.Time, 'time'),
+        (sa.VARCHAR, 'string'),
+    ]
+
+    # Postgresql dialect (JSON types are subclasses of `sa.JSON`)
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import ARRAY, UUID
+        mapping.extend([
+            (ARRAY, 'array'),
+            (UUID, 'string'),
+        ])
+
+    # Marked types (restored from comments or declared type names)
+    mapping.extend([
+        (_Duration, 'duration'),
+        (_GeoPoint, 'geopoint'),
+        (_YearMonth, 'yearmonth'),
+    ])
+
+    return mapping
+
+
+class _MarkedType(sa.types.TypeDecorator):
+    # Column type of a field type not restorable from the database type
+    declared_name = None
+
+
+class _YearMonth(_MarkedType):
+    cache_ok = True
+    declared_name = 'YEARMONTH'
+    impl = sa.Integer
+
+
+class _GeoPoint(_MarkedType):
+    cache_ok = True
+    declared_name = 'GEOPOINT'
+    impl = sa.JSON
+
+    def load_dialect_impl(self, dialect):
+        if dialect.name == 'postgresql':
+            from sqlalchemy.dialects.postgresql import ARRAY
+            return dialect.type_descriptor(ARRAY(sa.Numeric))
+        return dialect.type_descriptor(sa.JSON(none_as_null=True))
+
+
+class _Duration(_MarkedType):
+    cache_ok = True
+    impl = sa.Interval
+
+    def column_expression(self, column):
+        # Intervals are read by parts as drivers approximate months and years
+        parts = [sa.extract(part, column) for part in _INTERVAL_PARTS]
+        return sa.func.concat_ws(' ', *parts, type_=self)
+
+    def process_bind_param(self, value, dialect):
+        return _pack_duration(value)
+
+    def process_result_value(self, value, dialect):
+        if not isinstance(value, six.string_types):
+            return value
+        parts = [decimal.Decimal(part) for part in value.split()]
+        years, months, days, hours, minutes = [int(part) for part in parts[:5]]
+        delta = datetime.timedelta(days=days, hours=hours, minutes=minutes,
+            microseconds=int(parts[5] * 1000000))
+        if years or months:
+            return isodate.Duration(years=years, months=months) + delta
+        return delta
+
+
+@compiles(_YearMonth, 'sqlite')
+@compiles(_GeoPoint, 'sqlite')
+def _compile_declared_type(type, compiler, **kw):
+    return type.declared_name
+
+
+_INTERVAL_PARTS = ['year', 'month', 'day', 'hour', 'minute', 'second']
+_TYPE_MARKER = 'tableschema-sql type '
+
+
+def _add_type_marker(comment, field_type):
+    marker = _TYPE_MARKER + field_type
+    return '%s\n%s' % (comment, marker) if comment else marker
+
+
+def _get_type_marker(comment):
+    if comment:
+        line = comment.splitlines()[-1]
+        if line.startswith(_TYPE_MARKER):
+            return line[len(_TYPE_MARKER):]
+    return None
+
+
+def _get_packers(dialect):
+    # Native representations of values not supported by SQL drivers
+    packers = {'yearmonth': _pack_yearmonth}
+    if dialect == 'postgresql':
+        packers['duration'] = _pack_duration
+        packers['geopoint'] = list
+    elif dialect in ['sqlite', 'mysql']:
+        packers['geopoint'] = _pack_geopoint
+    return packers
+
+
+def _get_unpackers(dialect):
+    unpackers = {'yearmonth': _unpack_yearmonth}
+    if dialect in ['postgresql', 'sqlite', 'mysql']:
+        unpackers['geopoint'] = _unpack_geopoint
+    return unpackers
+
+
+def _pack_yearmonth(value):
+    # Plain (year, month) sequences are accepted along with cast values
+    return value[0] * 100 + value[1]
+
+
+def _unpack_yearmonth(value):
+    if isinstance(value, six.integer_types):
+        return divmod(value, 100)
+    return value
+
+
+def _pack_duration(value):
+    # Durations with years/months are passed as ISO 8601 strings
+    if isinstance(value, isodate.Duration):
+        return isodate.duration_isoformat(value)
+    return value
+
+
+def _pack_geopoint(value):
+    return [float(value[0]), float(value[1])]
+
+
+def _unpack_geopoint(value):
+    if isinstance(value, list):
+        return [decimal.Decimal(str(item)) for item in value]
+    return value
+
+
+_TYPED_VALUES = {
+    'array': list,
+    'boolean': bool,
+    'date': datetime.date,
+    'datetime': datetime.datetime,
+    'duration': (datetime.timedelta, isodate.Duration),
+    'geojson': dict,
+    'geopoint': (list, tuple),
+    'integer': six.integer_types,
+    'number': six.integer_types + (float, decimal.Decimal),
+    'object': dict,
+    'string': six.string_types,
+    'time': datetime.time,
+    'year': six.integer_types,
+    'yearmonth': (list, tuple),
+}
+
+
+def _check_typed_value(value, field, packer):
+    types = _TYPED_VALUES.get(field.type)
+    if types is not None:
+        valid = isinstance(value, types)
+        if isinstance(value, bool) and field.type != 'boolean':
+            valid = False
+        if isinstance(value, datetime.datetime) and field.type == 'date':
+            valid = False
+        if field.type in ['geopoint', 'yearmonth'] and valid and len(value) != 2:
+            valid = False
+        if field.type == 'yearmonth' and valid:
+            valid = all(isinstance(item, six.integer_types) for item in value)
+        if not valid:
+            message = 'Field "%s" can\'t accept value "%s" of type "%s"'
+            raise tableschema.exceptions.CastError(
+                message % (field.name, value, type(value).__name__))
+    return packer(value) if packer else value
+
+
 def _uncast_value(value, field):
     # Eventially should be moved to:
     # https://github.com/frictionlessdata/tableschema-py/issues/161
@@ -300,6 +641,19 @@ def _uncast_value(value, field):
     return value
 
 
+def _uncast_typed_value(value, field):
+    # Text representation cast back to the same value on reading
+    if isinstance(value, (datetime.timedelta, isodate.Duration)):
+        return isodate.duration_isoformat(value)
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, tuple) and field.type == 'yearmonth':
+        return '%04d-%02d' % value
+    if isinstance(value, tuple) and field.type == 'geopoint':
+        return '%s,%s' % value
+    return _uncast_value(value, field=field)
+
+
 def _get_field_comment(field, separator=' - '):
     """
     Create SQL comment from field's title and description
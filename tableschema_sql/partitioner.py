@@ -0,0 +1,293 @@
+# -*- coding: utf-8 -*-
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import re
+import json
+import decimal
+import hashlib
+import datetime
+import tableschema
+import sqlalchemy as sa
+
+
+# Module API
+
+class Partitioner(object):
+
+    # Public
+
+    def __init__(self, table_name, dbschema, spec, field_type):
+        """Partitioner to create/drop PostgreSQL declarative partitions
+
+        Range (by time interval or integer step) and list partitions are created
+        on demand for written values, hash partitions are created with the table.
+        Rows not matching any partition (e.g. nulls) go to a default partition.
+        """
+        spec = dict(spec)
+        strategy = spec.get('strategy', 'range')
+        if not spec.get('field') or strategy not in ['range', 'list', 'hash']:
+            message = 'Partitioning "%s" is not valid' % spec
+            raise tableschema.exceptions.StorageError(message)
+        if strategy == 'range':
+            interval = spec.get('interval')
+            valid = interval in _INTERVALS if field_type in ['date', 'datetime'] else \
+                field_type == 'integer' and isinstance(interval, int) and interval > 0
+            if not valid:
+                message = 'Partitioning interval "%s" is not valid for a "%s" field'
+                raise tableschema.exceptions.StorageError(message % (interval, field_type))
+        if strategy == 'hash':
+            if not isinstance(spec.get('partitions'), int) or spec['partitions'] < 1:
+                message = 'Hash partitioning requires a number of "partitions"'
+                raise tableschema.exceptions.StorageError(message)
+        spec['strategy'] = strategy
+        self.__table_name = table_name
+        self.__dbschema = dbschema
+        self.__spec = spec
+        self.__field_type = field_type
+        self.__known = set()
+
+    @property
+    def spec(self):
+        """Partitioning specification
+        """
+        return self.__spec
+
+    @property
+    def table_options(self):
+        """Table keyword arguments to create a partitioned table
+        """
+        definition = '%s ("%s")' % (self.__spec['strategy'].upper(), self.__spec['field'])
+        return {'postgresql_partition_by': definition}
+
+    def create(self, connection):
+        """Create default or hash partitions of a new table
+        """
+        if self.__spec['strategy'] == 'hash':
+            modulus = self.__spec['partitions']
+            for remainder in range(modulus):
+                self.__create(connection, _get_name(self.__table_name, 'p%s' % remainder),
+                    'FOR VALUES WITH (MODULUS %s, REMAINDER %s)' % (modulus, remainder))
+            return
+        # Default partition is kept out of the `_p` namespace of value partitions
+        name = _get_name(self.__table_name, 'default')
+        self.__create(connection, name, 'DEFAULT')
+        # Specification is kept to restore the partitioner on reflection
+        comment = _COMMENT + json.dumps(self.__spec, sort_keys=True)
+        _execute(connection, 'COMMENT ON TABLE %s IS %s' % (
+            self.__quote(connection, name), _literal(comment)))
+
+    def ensure(self, connection, keyed_rows):
+        """Create missing partitions for converted keyed rows
+        """
+        for name, bounds in self.__get_missing(keyed_rows):
+            self.__create(connection, name, bounds)
+            self.__known.add(name)
+
+    def is_missing(self, keyed_rows):
+        """Check if converted keyed rows need partitions not created by `ensure` yet
+        """
+        return bool(self.__get_missing(keyed_rows))
+
+    def list(self, connection):
+        """List partition names
+        """
+        return _get_partitions(connection, self.__dbschema, self.__table_name)
+
+    def drop(self, connection, before=None, values=None):
+        """Drop range partitions ending not after `before` or list partitions of `values`
+        """
+        names = []
+        strategy = self.__spec['strategy']
+        if strategy == 'range' and before is not None:
+            before = self.__normalize(before)
+            bounds = _get_partitions(connection, self.__dbschema, self.__table_name, bounds=True)
+            for name, bound in bounds:
+                start = self.__parse(bound)
+                if start is not None and self.__get_end(start) <= before:
+                    names.append(name)
+        elif strategy == 'list' and values is not None:
+            existing = self.list(connection)
+            for value in values:
+                name = self.__get_partition(value)[0]
+                if name in existing:
+                    names.append(name)
+        else:
+            message = 'Dropping "%s" partitions requires "%s"'
+            raise tableschema.exceptions.StorageError(
+                message % (strategy, 'before' if strategy == 'range' else 'values'))
+        for name in names:
+            _execute(connection, 'DROP TABLE %s' % self.__quote(connection, name))
+            self.__known.discard(name)
+        return names
+
+    @staticmethod
+    def list_all(connection, dbschema):
+        """List names of all partitions in a database schema
+        """
+        return _get_partitions(connection, dbschema, None)
+
+    @staticmethod
+    def reflect(connection, table_name, dbschema, field_types):
+        """Restore partitioner of an existing table (range/list only) or None
+        """
+        preparer = connection.dialect.identifier_preparer
+        name = preparer.quote_identifier(_get_name(table_name, 'default'))
+        if dbschema:
+            name = '%s.%s' % (preparer.quote_identifier(dbschema), name)
+        select = sa.text("SELECT obj_description(to_regclass(:name), 'pg_class')")
+        comment = connection.execute(select, {'name': name}).scalar()
+        if not comment or not comment.startswith(_COMMENT):
+            return None
+        spec = json.loads(comment[len(_COMMENT):])
+        return Partitioner(table_name, dbschema, spec, field_types.get(spec['field']))
+
+    # Private
+
+    def __create(self, connection, name, bounds):
+        sql = 'CREATE TABLE IF NOT EXISTS %s PARTITION OF %s %s' % (
+            self.__quote(connection, name),
+            self.__quote(connection, self.__table_name), bounds)
+        _execute(connection, sql)
+
+    def __quote(self, connection, name):
+        preparer = connection.dialect.identifier_preparer
+        if self.__dbschema:
+            return '%s.%s' % (preparer.quote_schema(self.__dbschema), preparer.quote(name))
+        return preparer.quote(name)
+
+    def __get_missing(self, keyed_rows):
+        missing = {}
+        if self.__spec['strategy'] == 'hash':
+            return []
+        for keyed_row in keyed_rows:
+            value = keyed_row.get(self.__spec['field'])
+            if value is None:
+                continue
+            name, bounds = self.__get_partition(value)
+            if name not in self.__known:
+                missing[name] = bounds
+        return list(missing.items())
+
+    def __get_partition(self, value):
+        """Get partition name and bounds clause for a value
+        """
+
+        # List
+        if self.__spec['strategy'] == 'list':
+            suffix = re.sub(r'\W', '_', str(value))
+            if suffix != str(value):
+                suffix += '_' + hashlib.md5(str(value).encode('utf-8')).hexdigest()[:8]
+            name = _get_name(self.__table_name, 'p' + suffix)
+            return name, 'FOR VALUES IN (%s)' % _literal(value)
+
+        # Range
+        start = self.__get_start(value)
+        end = self.__get_end(start)
+        if isinstance(start, int):
+            suffix = str(start).replace('-', 'm')
+            return _get_name(self.__table_name, 'p' + suffix), \
+                'FOR VALUES FROM (%s) TO (%s)' % (start, end)
+        suffix = start.strftime(_INTERVALS[self.__spec['interval']])
+        return _get_name(self.__table_name, 'p' + suffix), \
+            'FOR VALUES FROM (%s) TO (%s)' % (
+                _literal(start.isoformat()), _literal(end.isoformat()))
+
+    def __get_start(self, value):
+        interval = self.__spec['interval']
+        if isinstance(interval, int):
+            return value // interval * interval
+        if isinstance(value, datetime.datetime):
+            value = value.date()
+        if interval == 'week':
+            return value - datetime.timedelta(days=value.weekday())
+        if interval == 'month':
+            return value.replace(day=1)
+        if interval == 'year':
+            return value.replace(month=1, day=1)
+        return value
+
+    def __get_end(self, start):
+        interval = self.__spec['interval']
+        if isinstance(interval, int):
+            return start + interval
+        if interval == 'day':
+            return start + datetime.timedelta(days=1)
+        if interval == 'week':
+            return start + datetime.timedelta(days=7)
+        if interval == 'month':
+            if start.month == 12:
+                return start.replace(year=start.year + 1, month=1)
+            return start.replace(month=start.month + 1)
+        return start.replace(year=start.year + 1)
+
+    def __parse(self, bound):
+        """Parse start of a range partition from its bound expression
+        """
+        # Names can be shortened so bounds are used e.g. "FOR VALUES FROM ('2015-01-01') TO ..."
+        match = re.match(r"^FOR VALUES FROM \('?([^')]+)'?\)", bound or '')
+        if not match:
+            return None
+        try:
+            if isinstance(self.__spec['interval'], int):
+                return int(match.group(1))
+            return datetime.datetime.strptime(match.group(1)[:10], '%Y-%m-%d').date()
+        except ValueError:
+            return None
+
+    def __normalize(self, before):
+        # Partition bounds are dates
+        if isinstance(before, datetime.datetime):
+            return before.date()
+        return before
+
+
+# Internal
+
+_COMMENT = 'tableschema-sql partition_by '
+_INTERVALS = {'day': '%Y%m%d', 'week': '%Y%m%d', 'month': '%Y%m', 'year': '%Y'}
+_MAX_NAME_LENGTH = 63
+
+
+def _get_name(table_name, suffix):
+    # PostgreSQL truncates longer identifiers so they are shortened with a hash
+    name = '%s_%s' % (table_name, suffix)
+    encoded = name.encode('utf-8')
+    if len(encoded) <= _MAX_NAME_LENGTH:
+        return name
+    digest = hashlib.md5(encoded).hexdigest()[:8]
+    head = encoded[:_MAX_NAME_LENGTH - len(digest) - 1].decode('utf-8', 'ignore')
+    return '%s_%s' % (head, digest)
+
+
+def _get_partitions(connection, dbschema, table_name, bounds=False):
+    select = sa.text("""
+        SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        JOIN pg_class p ON p.oid = i.inhparent
+        JOIN pg_namespace n ON n.oid = p.relnamespace
+        WHERE p.relkind = 'p' AND n.nspname = coalesce(:dbschema, current_schema())
+        AND (:table_name IS NULL OR p.relname = :table_name)
+    """)
+    params = {'dbschema': dbschema, 'table_name': table_name}
+    rows = connection.execute(select, params)
+    if bounds:
+        return [(name, bound) for name, bound in rows]
+    return [name for name, bound in rows]
+
+
+def _execute(connection, sql):
+    # Literals can contain colons
+    connection.execute(sa.text(sql.replace(':', '\\:')))
+
+
+def _literal(value):
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, (int, float, decimal.Decimal)):
+        return str(value)
+    if isinstance(value, (datetime.date, datetime.time)):
+        value = value.isoformat()
+    return "'%s'" % str(value).replace("'", "''")
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import os
+import glob
+import pickle
+import hashlib
+import tempfile
+
+
+# Module API
+
+class KeySnapshot(object):
+
+    # Public
+
+    def __init__(self, directory, table_name, update_keys):
+        """Serialized update keys index stored on the local disk
+
+        The index is stamped with the table row count and, if available,
+        the autoincrement high-water mark it was built up to.
+        """
+        digest = hashlib.md5('\x00'.join(update_keys).encode('utf-8')).hexdigest()
+        self.__directory = directory
+        self.__path = os.path.join(directory, '%s-%s.keys' % (table_name, digest))
+
+    @property
+    def path(self):
+        """Snapshot file path
+        """
+        return self.__path
+
+    def load(self):
+        """Load snapshot as a `(keys, count, watermark)` tuple or None
+        """
+        try:
+            with open(self.__path, 'rb') as file:
+                return pickle.load(file)
+        except (IOError, OSError, EOFError, pickle.UnpicklingError):
+            return None
+
+    def save(self, keys, count, watermark):
+        """Atomically save snapshot
+        """
+        if not os.path.exists(self.__directory):
+            os.makedirs(self.__directory)
+        descriptor, path = tempfile.mkstemp(dir=self.__directory)
+        try:
+            with os.fdopen(descriptor, 'wb') as file:
+                pickle.dump((keys, count, watermark), file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(path, self.__path)
+        except Exception:
+            os.remove(path)
+            raise
+
+    def remove(self):
+        """Remove snapshot
+        """
+        if os.path.exists(self.__path):
+            os.remove(self.__path)
+
+    @staticmethod
+    def remove_all(directory, table_name):
+        """Remove all snapshots of a table
+        """
+        pattern = '%s-*.keys' % glob.escape(table_name)
+        for path in glob.glob(os.path.join(glob.escape(directory), pattern)):
+            os.remove(path)
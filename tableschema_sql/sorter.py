@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import re
+import sys
+import heapq
+import pickle
+import tempfile
+import tableschema
+
+
+# Module API
+
+class Sorter(object):
+
+    # Public
+
+    def __init__(self, keys, memory, fan_in=64):
+        """External merge sorter of keyed rows within a memory budget
+
+        Rows are sorted in memory until the budget is exceeded, then every
+        sorted run is spilled to a temporary file and all runs are k-way
+        merged. Once `fan_in` runs of the same size are spilled they are
+        merged into a bigger run, so open files grow logarithmically with
+        the number of runs. Sorting is stable and nulls are sorted last.
+        """
+        self.__keys = keys
+        self.__memory = _parse_size(memory)
+        self.__fan_in = fan_in
+
+    def sort(self, keyed_rows):
+        """Yield keyed rows sorted by keys
+        """
+        runs = []
+        try:
+            buffer = []
+            size = 0
+            for keyed_row in keyed_rows:
+                buffer.append(keyed_row)
+                size += _get_size(keyed_row)
+                if size > self.__memory:
+                    buffer.sort(key=self.__get_key)
+                    runs.append((0, self.__spill(buffer)))
+                    self.__compact(runs)
+                    buffer = []
+                    size = 0
+            buffer.sort(key=self.__get_key)
+            if not runs:
+                for keyed_row in buffer:
+                    yield keyed_row
+                return
+            iterators = [_read(run) for _, run in runs] + [iter(buffer)]
+            for keyed_row in self.__merge(iterators):
+                yield keyed_row
+        finally:
+            for _, run in runs:
+                run.close()
+
+    # Private
+
+    def __get_key(self, keyed_row):
+        key = []
+        for name in self.__keys:
+            value = keyed_row.get(name)
+            key.append((value is None, value))
+        return key
+
+    def __merge(self, iterators):
+        # Ties are taken from earlier runs first
+        return heapq.merge(*iterators, key=self.__get_key)
+
+    def __compact(self, runs):
+        """Merge trailing `(level, run)` runs while `fan_in` of them share a level
+        """
+        while len(runs) >= self.__fan_in:
+            tail = runs[-self.__fan_in:]
+            level = tail[0][0]
+            if any(item[0] != level for item in tail):
+                break
+            del runs[-self.__fan_in:]
+            try:
+                merged = self.__spill(self.__merge([_read(run) for _, run in tail]))
+            finally:
+                for _, run in tail:
+                    run.close()
+            runs.append((level + 1, merged))
+
+    def __spill(self, keyed_rows):
+        run = tempfile.TemporaryFile()
+        for keyed_row in keyed_rows:
+            pickle.dump(keyed_row, run, pickle.HIGHEST_PROTOCOL)
+        run.seek(0)
+        return run
+
+
+# Internal
+
+_UNITS = {'B': 1, 'KB': 1024, 'MB': 1024 ** 2, 'GB': 1024 ** 3}
+
+
+def _parse_size(size):
+    if isinstance(size, int) and size > 0:
+        return size
+    match = re.match(r'^\s*(\d+)\s*([KMG]?B)\s*$', str(size), re.IGNORECASE)
+    if not match or not int(match.group(1)):
+        message = 'Size "%s" is not valid' % size
+        raise tableschema.exceptions.StorageError(message)
+    return int(match.group(1)) * _UNITS[match.group(2).upper()]
+
+
+def _read(run):
+    while True:
+        try:
+            yield pickle.load(run)
+        except EOFError:
+            return
+
+
+def _get_size(keyed_row):
+    # Shallow estimate: the row and its direct values
+    size = sys.getsizeof(keyed_row)
+    for value in keyed_row.values():
+        size += sys.getsizeof(value)
+    return size
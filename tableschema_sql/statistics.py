@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import sqlalchemy as sa
+
+
+# Module API
+
+def estimate_count(connection, table):
+    """Estimate table row count from the catalog or return None
+
+    Estimates are only available for analyzed tables.
+    """
+    dialect = connection.dialect.name
+
+    # PostgreSQL
+    if dialect == 'postgresql':
+        name = _get_regclass(connection, table)
+        select = sa.text('SELECT reltuples, relpages, relkind FROM pg_class '
+            'WHERE oid = to_regclass(:name)')
+        row = connection.execute(select, {'name': name}).first()
+        # Partitioned tables have no statistics of their own so partitions are summed
+        # (not analyzed partitions, e.g. new ones, are estimated by the live tuples)
+        if row is not None and row[2] == 'p':
+            select = sa.text('SELECT sum(CASE WHEN c.reltuples < 0 OR '
+                '(c.reltuples = 0 AND c.relpages = 0) THEN pg_stat_get_live_tuples(c.oid) '
+                'ELSE c.reltuples END) FROM pg_partition_tree(to_regclass(:name)) t '
+                'JOIN pg_class c ON c.oid = t.relid WHERE t.isleaf')
+            count = connection.execute(select, {'name': name}).scalar()
+            return int(count) if count is not None else None
+        # Never analyzed tables have -1 (or 0 before PostgreSQL 14) tuples and no pages
+        if row is None or row[0] < 0 or (row[0] == 0 and row[1] == 0):
+            return None
+        return int(row[0])
+
+    # SQLite
+    if dialect == 'sqlite':
+        if not _has_sqlite_table(connection, table.schema, 'sqlite_stat1'):
+            return None
+        select = sa.text('SELECT stat FROM %s WHERE tbl = :name AND idx IS NULL' %
+            _get_sqlite_name(connection, table.schema, 'sqlite_stat1'))
+        stat = connection.execute(select, {'name': table.name}).scalar()
+        if stat is None:
+            # Tables with indexes only have per index statistics
+            select = sa.text('SELECT stat FROM %s WHERE tbl = :name' %
+                _get_sqlite_name(connection, table.schema, 'sqlite_stat1'))
+            stat = connection.execute(select, {'name': table.name}).scalar()
+        return int(stat.split()[0]) if stat else None
+
+    # MySQL
+    if dialect == 'mysql':
+        select = sa.text('SELECT TABLE_ROWS FROM information_schema.TABLES '
+            'WHERE TABLE_SCHEMA = coalesce(:schema, DATABASE()) AND TABLE_NAME = :name')
+        params = {'schema': table.schema, 'name': table.name}
+        count = connection.execute(select, params).scalar()
+        return int(count) if count is not None else None
+
+    return None
+
+
+def get_sizes(connection, table):
+    """Get table and index sizes in bytes as `(bytes, {index: bytes})`
+
+    Sizes not available for the dialect are returned as None.
+    """
+    dialect = connection.dialect.name
+
+    # PostgreSQL (partitioned tables and indexes are summed over their partitions)
+    if dialect == 'postgresql':
+        name = _get_regclass(connection, table)
+        select = sa.text('SELECT sum(pg_table_size(relid)) '
+            'FROM pg_partition_tree(to_regclass(:name))')
+        size = connection.execute(select, {'name': name}).scalar()
+        select = sa.text('SELECT c.relname, (SELECT sum(pg_relation_size(t.relid)) '
+            'FROM pg_partition_tree(i.indexrelid) t) FROM pg_index i '
+            'JOIN pg_class c ON c.oid = i.indexrelid WHERE i.indrelid = to_regclass(:name)')
+        indexes = dict((index, int(index_size))
+            for index, index_size in connection.execute(select, {'name': name}))
+        return int(size) if size is not None else None, indexes
+
+    # SQLite (requires the `dbstat` virtual table)
+    if dialect == 'sqlite':
+        try:
+            dbstat = _get_sqlite_name(connection, table.schema, 'dbstat')
+            select = sa.text('SELECT sum(pgsize) FROM %s WHERE name = :name' % dbstat)
+            size = connection.execute(select, {'name': table.name}).scalar()
+            select = sa.text('SELECT name FROM %s WHERE type = \'index\' AND tbl_name = :name' %
+                _get_sqlite_name(connection, table.schema, 'sqlite_master'))
+            indexes = {}
+            for index, in connection.execute(select, {'name': table.name}):
+                select = sa.text('SELECT sum(pgsize) FROM %s WHERE name = :name' % dbstat)
+                indexes[index] = connection.execute(select, {'name': index}).scalar()
+            return size, indexes
+        except sa.exc.OperationalError:
+            return None, None
+
+    # MySQL (index sizes are only available as a total)
+    if dialect == 'mysql':
+        select = sa.text('SELECT DATA_LENGTH FROM information_schema.TABLES '
+            'WHERE TABLE_SCHEMA = coalesce(:schema, DATABASE()) AND TABLE_NAME = :name')
+        params = {'schema': table.schema, 'name': table.name}
+        return connection.execute(select, params).scalar(), None
+
+    return None, None
+
+
+def get_column_stats(connection, table, names):
+    """Get `{name: {'min', 'max', 'nulls'}}` and the row count with one aggregate query
+
+    Min and max are computed only for orderable types.
+    """
+    aggregates = [sa.func.count()]
+    for name in names:
+        column = getattr(table.c, name)
+        aggregates.append(sa.func.count(column))
+        if _is_orderable(column.type):
+            aggregates.extend([sa.func.min(column), sa.func.max(column)])
+    values = list(connection.execute(sa.select(*aggregates).select_from(table)).one())
+    count = values.pop(0)
+    result = {}
+    for name in names:
+        column = getattr(table.c, name)
+        stats = {'nulls': count - values.pop(0), 'min': None, 'max': None}
+        if _is_orderable(column.type):
+            stats['min'] = values.pop(0)
+            stats['max'] = values.pop(0)
+        result[name] = stats
+    return result, count
+
+
+# Internal
+
+def _is_orderable(type):
+    if isinstance(type, (sa.Boolean, sa.JSON, sa.ARRAY)):
+        return False
+    return isinstance(type, (sa.Integer, sa.Numeric, sa.Float, sa.Date,
+        sa.DateTime, sa.Time, sa.Interval, sa.String))
+
+
+def _get_regclass(connection, table):
+    preparer = connection.dialect.identifier_preparer
+    return preparer.format_table(table)
+
+
+def _get_sqlite_name(connection, schema, name):
+    if schema:
+        return '%s.%s' % (connection.dialect.identifier_preparer.quote_schema(schema), name)
+    return name
+
+
+def _has_sqlite_table(connection, schema, name):
+    select = sa.text('SELECT count(*) FROM %s WHERE type = \'table\' AND name = :name' %
+        _get_sqlite_name(connection, schema, 'sqlite_master'))
+    return bool(connection.execute(select, {'name': name}).scalar())
@@ -4,8 +4,16 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import copy
+import time
+import uuid
+import itertools
+import threading
+import contextlib
 import collections
 from functools import partial
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 
 import re
 import six
@@ -14,7 +22,18 @@ import tableschema
 from sqlalchemy import Table, MetaData
 
 from .mapper import Mapper
-from .writer import Writer
+from .writer import Writer, BucketWriter, PROGRESS_TABLE
+from .loader import ParallelWriter
+from .caster import Caster
+from .sorter import Sorter
+from .exporter import Exporter
+from .snapshot import KeySnapshot
+from .partitioner import Partitioner
+from .cache import RowCache
+from . import statistics
+from . import catalog
+from .helpers import connect, begin, begin_ddl
+CopiedBucket = namedtuple('CopiedBucket', ['rows', 'seconds', 'rows_per_second'])
 
 
 # Module API
@@ -42,21 +61,49 @@ class Storage(tableschema.Storage):
               - if a dict it's an autoincrements mapping with column
                 names indexed by bucket names, for example,
                 `{'bucket1'\\: 'id', 'bucket2'\\: 'other_id}`
+        key_snapshots (str):
+            directory to persist `update_keys` indexes between writes;
+            only rows added since a snapshot was taken are scanned
+            (rows after the autoincrement high-water mark or, without
+            autoincrement, nothing if the row count is unchanged);
+            keys missing in the index are checked in the table before inserting
+            and writers save the index at most once a minute and on `close`
+        cache_size (int):
+            memory budget in bytes of an LRU cache of rows returned by `read`;
+            cached rows are invalidated by this storage's writes, `create` and `delete`
+        cache_check (str):
+            cheap query to detect writes from other processes on every cached `read`:
+              - `count`: the row count of the bucket
+              - `autoincrement`: the row count and the maximum autoincrement value
+            (updates of existing rows by other processes aren't detected)
+        reflect_catalog (bool):
+            reflect only columns, primary and foreign keys of all tables with
+            a few bulk catalog queries (faster for schemas with many tables);
+            indexes are reflected on demand by `indexes` (SQLite has no bulk
+            catalog queries so only the indexes and other constraints are skipped)
 
     """
 
     # Public
 
-    def __init__(self, engine, dbschema=None, prefix='', reflect_only=None, autoincrement=None):
+    def __init__(self, engine, dbschema=None, prefix='', reflect_only=None, autoincrement=None,
+                 key_snapshots=None, cache_size=None, cache_check=None, reflect_catalog=False):
 
         # Set attributes
         self.__engine = engine
+        self.__local = threading.local()
         self.__dbschema = dbschema
         self.__prefix = prefix
         self.__descriptors = {}
         self.__fallbacks = {}
+        self.__partitioners = {}
+        self.__lookups = {}
         self.__autoincrement = autoincrement
+        self.__key_snapshots = key_snapshots
+        self.__cache = RowCache(cache_size) if cache_size else None
+        self.__cache_check = cache_check
         self.__only = reflect_only or (lambda _: True)
+        self.__reflect_catalog = reflect_catalog
         self.__dialect = engine.dialect.name
 
         # Added regex support to sqlite
@@ -68,11 +115,25 @@ class Storage(tableschema.Storage):
             with self.__engine.connect() as __connection:
                 __connection.connection.create_function('REGEXP', 2, regexp)
 
+        # Check cache
+        if cache_check not in [None, 'count', 'autoincrement']:
+            message = 'Cache check "%s" is not supported' % cache_check
+            raise tableschema.exceptions.StorageError(message)
+
         # Create mapper
         self.__mapper = Mapper(prefix=prefix, dialect=self.__dialect)
 
+        # Restore marked types by declared type names (only this engine's dialect)
+        declared_types = self.__mapper.get_declared_types()
+        if declared_types:
+            dialect = self.__engine.dialect
+            dialect.ischema_names = dict(dialect.ischema_names, **declared_types)
+
         # Create metadata and reflect
         self.__metadata = MetaData(schema=self.__dbschema)
+        sqlalchemy.event.listen(self.__metadata, 'column_reflect',
+            lambda inspector, table, column_info: self.__mapper.restore_column(column_info))
+        self.__temporary = MetaData()
         self.__reflect()
 
     def __repr__(self):
@@ -88,18 +149,115 @@ class Storage(tableschema.Storage):
     @property
     def buckets(self):
         buckets = []
-        for table in self.__metadata.sorted_tables:
+        for table in self.__metadata.sorted_tables + self.__temporary.sorted_tables:
             bucket = self.__mapper.restore_bucket(table.name)
             if bucket is not None:
                 buckets.append(bucket)
         return buckets
 
-    def create(self, bucket, descriptor, force=False, indexes_fields=None):
+    @contextlib.contextmanager
+    def session(self):
+        """Bind one connection and transaction to storage operations
+
+        All `create`, `delete`, `iter`, `read` and `write` calls (and writers
+        created) of the current thread inside the block share the connection.
+        The transaction is committed on exit or rolled back on an exception.
+        Writers created in the session are flushed before the commit and
+        can't be used after the session; key snapshots of deleted buckets
+        are removed after the commit. Temporary buckets created in the session
+        are forgotten on exit unless the engine has a single connection pool.
+
+        ```python
+        with storage.session() as session:
+            session.write('bucket1', rows1)
+            session.write('bucket2', rows2)
+        ```
+
+        # Returns
+            Storage: the storage bound to the session
+
+        """
+        if self.__connection is not None:
+            message = 'Storage session is already active'
+            raise tableschema.exceptions.StorageError(message)
+        temporary = set(self.__temporary.tables)
+        writers = []
+        removals = []
+        try:
+            with self.__engine.connect() as connection:
+                with connection.begin():
+                    if self.__dialect == 'sqlite':
+                        # Driver doesn't begin before DDL statements
+                        connection.exec_driver_sql('BEGIN')
+                    self.__local.connection = connection
+                    self.__local.writers = writers
+                    self.__local.removals = removals
+                    try:
+                        yield self
+                        for writer in writers:
+                            writer.close()
+                    finally:
+                        self.__local.connection = None
+                        for writer in writers:
+                            writer.expire()
+        except Exception:
+            # Forget buckets created in the rolled back transaction
+            self.__metadata.clear()
+            self.__forget_temporary(temporary)
+            self.__partitioners.clear()
+            self.__invalidate()
+            self.__reflect()
+            for bucket in list(self.__descriptors):
+                if bucket not in self.buckets:
+                    del self.__descriptors[bucket]
+            raise
+
+        # Snapshots of buckets deleted in the committed transaction
+        for table_name in removals:
+            KeySnapshot.remove_all(self.__key_snapshots, table_name)
+
+        # Temporary tables of the session exist only on its pooled connection
+        single_pools = (sqlalchemy.pool.SingletonThreadPool, sqlalchemy.pool.StaticPool)
+        if not isinstance(self.__engine.pool, single_pools):
+            self.__forget_temporary(temporary)
+
+    def create(self, bucket, descriptor, force=False, indexes_fields=None, partition_by=None,
+               durability=None):
         """Create bucket
 
         # Arguments
-            indexes_fields (str[]):
-                list of tuples containing field names, or list of such lists
+            indexes_fields (list[]):
+                list of index definitions, or list of such lists (one per bucket).
+                A definition is a list of field names or a dict:
+                  - `fields` (str[]): indexed field names
+                  - `name` (str): index name (`<table>_ixNNN` by default)
+                  - `unique` (bool): create a unique index
+                  - `using` (str): index method, e.g. `gin` or `brin` (PostgreSQL)
+                  - `where` (str): SQL predicate of a partial index (PostgreSQL/SQLite)
+                  - `include` (str[]): covered non-key fields (PostgreSQL)
+
+                Options not supported by the dialect are ignored, and
+                partial indexes are skipped on MySQL.
+            partition_by (dict):
+                create a declaratively partitioned table (PostgreSQL only),
+                or list of such dicts (one per bucket):
+                  - `field` (str): partition key field
+                  - `strategy` (str='range'): `range`, `list` or `hash`
+                  - `interval` (str/int): range of a partition, `day`, `week`,
+                    `month` or `year` for date/datetime fields and a step
+                    for integer fields
+                  - `partitions` (int): number of hash partitions
+
+                Range and list partitions are created by `write` for new values,
+                rows not matching any partition go to a default partition.
+            durability (str):
+                create tables for data that can be lost:
+                  - `unlogged`: `UNLOGGED` tables skipping the write-ahead log
+                    (PostgreSQL only)
+                  - `temporary`: temporary tables dropped with the database
+                    connection, so they have to be used within a `session`
+                    (and are forgotten on its exit) or with a single
+                    connection pool (e.g. SQLite `:memory:`)
 
         """
 
@@ -112,13 +270,27 @@ class Storage(tableschema.Storage):
             descriptors = [descriptor]
         if indexes_fields is None or len(indexes_fields) == 0:
             indexes_fields = [()] * len(descriptors)
-        elif type(indexes_fields[0][0]) not in {list, tuple}:
+        elif isinstance(indexes_fields[0], dict) or (
+                indexes_fields[0] and isinstance(indexes_fields[0][0], six.string_types)):
             indexes_fields = [indexes_fields]
 
+        if partition_by is None:
+            partition_by = [None] * len(descriptors)
+        elif isinstance(partition_by, dict):
+            partition_by = [partition_by]
+
         # Check dimensions
-        if not (len(buckets) == len(descriptors) == len(indexes_fields)):
+        if not (len(buckets) == len(descriptors) == len(indexes_fields) == len(partition_by)):
             raise tableschema.exceptions.StorageError('Wrong argument dimensions')
 
+        # Check partitioning
+        if any(partition_by) and self.__dialect != 'postgresql':
+            message = 'Partitioning is not supported for "%s"' % self.__dialect
+            raise tableschema.exceptions.StorageError(message)
+
+        # Check durability
+        prefixes = self.__get_durability_prefixes(durability)
+
         # Check buckets for existence
         for bucket in reversed(self.buckets):
             if bucket in buckets:
@@ -128,26 +300,50 @@ class Storage(tableschema.Storage):
                 self.delete(bucket)
 
         # Define buckets
-        for bucket, descriptor, index_fields in zip(buckets, descriptors, indexes_fields):
+        partitioners = []
+        for bucket, descriptor, index_fields, spec in zip(
+                buckets, descriptors, indexes_fields, partition_by):
             tableschema.validate(descriptor)
             table_name = self.__mapper.convert_bucket(bucket)
             autoincrement = self.__get_autoincrement_for_bucket(bucket)
             columns, constraints, indexes, fallbacks, table_comment = self.__mapper \
                 .convert_descriptor(bucket, descriptor, index_fields, autoincrement)
-            Table(table_name, self.__metadata, *(columns + constraints + indexes),
-                  comment=table_comment)
+            options = {}
+            if spec:
+                field = tableschema.Schema(descriptor).get_field(spec.get('field'))
+                if field is None:
+                    message = 'Partition key field "%s" doesn\'t exist' % spec.get('field')
+                    raise tableschema.exceptions.StorageError(message)
+                partitioner = Partitioner(table_name, self.__dbschema, spec, field.type)
+                options = partitioner.table_options
+                partitioners.append(partitioner)
+                self.__partitioners[bucket] = partitioner
+            # Temporary tables can't be created in a database schema and aren't reflected
+            metadata = self.__temporary if prefixes == ['TEMPORARY'] else self.__metadata
+            Table(table_name, metadata, *(columns + constraints + indexes),
+                  comment=table_comment, prefixes=prefixes, **options)
             self.__descriptors[bucket] = descriptor
             self.__fallbacks[bucket] = fallbacks
+            self.__invalidate(bucket)
 
         # Create tables, update metadata
         try:
-            self.__metadata.create_all(bind=self.__engine)
+            self.__metadata.create_all(bind=self.__bind)
+            self.__temporary.create_all(bind=self.__bind)
         except sqlalchemy.exc.ProgrammingError as exception:
             if 'there is no unique constraint matching given keys' in str(exception):
                 message = 'Foreign keys can only reference primary key or unique fields\n%s'
                 six.raise_from(
                     tableschema.exceptions.ValidationError(message % str(exception)),
                     None)
+            raise
+
+        # Create partitions
+        if partitioners:
+            with connect(self.__bind) as connection:
+                with begin(connection):
+                    for partitioner in partitioners:
+                        partitioner.create(connection)
 
     def delete(self, bucket=None, ignore=False):
 
@@ -172,13 +368,22 @@ class Storage(tableschema.Storage):
             # Remove from buckets
             if bucket in self.__descriptors:
                 del self.__descriptors[bucket]
+            self.__partitioners.pop(bucket, None)
+            self.__invalidate(bucket)
 
             # Add table to tables
             table = self.__get_table(bucket)
-            tables.append(table)
+            if table.metadata is self.__temporary:
+                table.drop(bind=self.__bind)
+                self.__temporary.remove(table)
+            else:
+                tables.append(table)
+
+            # Remove key snapshots
+            self.__remove_key_snapshots(table)
 
         # Drop tables, update metadata
-        self.__metadata.drop_all(tables=tables, bind=self.__engine)
+        self.__metadata.drop_all(tables=tables, bind=self.__bind)
         self.__metadata.clear()
         self.__reflect()
 
@@ -199,29 +404,224 @@ class Storage(tableschema.Storage):
 
         return descriptor
 
-    def iter(self, bucket):
+    def indexes(self, bucket):
+        """Get index definitions of a bucket
+
+        # Arguments
+            bucket (str): bucket name
+
+        # Returns
+            dict[]: index definitions in the `create(indexes_fields=...)` format
+
+        """
+        table = self.__get_table(bucket)
+        if self.__reflect_catalog and table.metadata is self.__metadata:
+            table = Table(table.name, MetaData(schema=table.schema), autoload_with=self.__bind)
+        return self.__mapper.restore_indexes(table.indexes)
+
+    def count(self, bucket, exact=True):
+        """Count bucket rows without reading them
+
+        # Arguments
+            bucket (str): bucket name
+            exact (bool=True):
+                with `False` the estimate from catalog statistics is returned
+                (`pg_class.reltuples` summed over partitions for partitioned tables,
+                `sqlite_stat1` or MySQL `TABLE_ROWS`) falling back to an exact
+                count if the table isn't analyzed
+
+        # Returns
+            int: number of rows
+
+        """
+        table = self.__get_table(bucket)
+        with connect(self.__bind) as connection:
+            if not exact:
+                count = statistics.estimate_count(connection, table)
+                if count is not None:
+                    return count
+            select = sqlalchemy.select(sqlalchemy.func.count()).select_from(table)
+            return connection.execute(select).scalar()
+
+    def stats(self, bucket):
+        """Get bucket statistics computed by the database
+
+        # Arguments
+            bucket (str): bucket name
+
+        # Returns
+            dict: statistics with keys:
+              - `count` (int): number of rows
+              - `bytes` (int): table size (None if not available)
+              - `indexes` (dict): index sizes by index name (None if not available);
+                sizes of partitioned tables and indexes are summed over partitions
+              - `fields` (dict): `min`, `max` (only for orderable types)
+                and `nulls` count by field name
+
+        """
+        table = self.__get_table(bucket)
+        names = [field['name'] for field in self.describe(bucket)['fields']]
+        with connect(self.__bind) as connection:
+            size, indexes = statistics.get_sizes(connection, table)
+            fields, count = statistics.get_column_stats(connection, table, names)
+        return {'count': count, 'bytes': size, 'indexes': indexes, 'fields': fields}
+
+    def get(self, bucket, key, key_fields=None):
+        """Get a row by key
+
+        # Arguments
+            bucket (str): bucket name
+            key (any/list): key value or list of values for a composite key
+            key_fields (str[]): see `storage.get_many`
+
+        # Returns
+            list: row or None if not found
+
+        """
+        return self.get_many(bucket, [key], key_fields=key_fields)[0]
+
+    def get_many(self, bucket, keys, key_fields=None, chunk_size=500):
+        """Get rows by keys
+
+        Keys are looked up with `WHERE (key1, key2) IN (...)` queries
+        of `chunk_size` keys which can use the primary key index.
+
+        # Arguments
+            bucket (str): bucket name
+            keys (list): key values or lists of values for a composite key
+            key_fields (str[]):
+                names of key fields (defaults to the descriptor's `primaryKey`);
+                if keys aren't unique the first found row is returned
+            chunk_size (int=500): maximum number of keys per query
+
+        # Returns
+            list[]: rows (or None if not found) in the order of `keys`
+
+        """
+
+        # Get table and description
+        table = self.__get_table(bucket)
+        descriptor = self.describe(bucket)
+        schema = tableschema.Schema(descriptor)
+        fallbacks = self.__fallbacks.get(bucket, [])
+        autoincrement = self.__get_autoincrement_for_bucket(bucket)
+
+        # Get key fields
+        if key_fields is None:
+            key_fields = descriptor.get('primaryKey')
+            if key_fields is None:
+                message = 'Bucket "%s" has no primary key, "key_fields" is required' % bucket
+                raise tableschema.exceptions.StorageError(message)
+        if isinstance(key_fields, six.string_types):
+            key_fields = [key_fields]
+        statement = self.__get_lookup(bucket, table, key_fields)
+        positions = [list(table.columns).index(getattr(table.c, name)) for name in key_fields]
+
+        # Convert keys
+        converted = []
+        for key in keys:
+            if not isinstance(key, (list, tuple)):
+                key = [key]
+            if len(key) != len(key_fields):
+                message = 'Key "%s" doesn\'t match key fields "%s"' % (key, key_fields)
+                raise tableschema.exceptions.StorageError(message)
+            row = self.__mapper.convert_row(
+                dict(zip(key_fields, key)), schema=schema, fallbacks=fallbacks)
+            converted.append(tuple(row[name] for name in key_fields))
+
+        # Query unique keys in chunks
+        found = {}
+        unique = list(collections.OrderedDict.fromkeys(converted))
+        with connect(self.__bind) as connection:
+            for start in range(0, len(unique), chunk_size):
+                chunk = unique[start:start + chunk_size]
+                if len(key_fields) == 1:
+                    chunk = [key[0] for key in chunk]
+                for row in connection.execute(statement, {'keys': chunk}):
+                    found.setdefault(tuple(row[position] for position in positions), row)
+
+        # Restore rows in the keys order
+        rows = []
+        for key in converted:
+            row = found.get(key)
+            if row is not None:
+                row = self.__mapper.restore_row(row, schema=schema, autoincrement=autoincrement)
+            rows.append(row)
+        return rows
+
+    def iter(self, bucket, fields=None):
+        """Iterate over bucket rows
+
+        # Arguments
+            bucket (str): bucket name
+            fields (str[]): names of fields to select (defaults to all)
+
+        # Returns
+            list[]: rows generator
+
+        """
 
         # Get table and fallbacks
         table = self.__get_table(bucket)
-        schema = tableschema.Schema(self.describe(bucket))
+        descriptor = self.describe(bucket)
         autoincrement = self.__get_autoincrement_for_bucket(bucket)
+        select = table.select()
+
+        # Select fields
+        if fields is not None:
+            mapping = dict((field['name'], field) for field in descriptor['fields'])
+            for name in fields:
+                if name not in mapping:
+                    message = 'Field "%s" doesn\'t exist in bucket "%s"' % (name, bucket)
+                    raise tableschema.exceptions.StorageError(message)
+            descriptor = {'fields': [mapping[name] for name in fields]}
+            select = select.with_only_columns(*[getattr(table.c, name) for name in fields])
+            autoincrement = None
+        schema = tableschema.Schema(descriptor)
 
         # Streaming could be not working for some backends:
         # http://docs.sqlalchemy.org/en/latest/core/connections.html
-        select = table.select().execution_options(stream_results=True)
-        with self.__engine.connect() as connection:
+        select = select.execution_options(stream_results=True)
+        with connect(self.__bind) as connection:
             result = connection.execute(select)
             for row in result:
                 row = self.__mapper.restore_row(
                     row, schema=schema, autoincrement=autoincrement)
                 yield row
 
-    def read(self, bucket):
-        rows = list(self.iter(bucket))
-        return rows
+    def read(self, bucket, fields=None):
+        """Read bucket rows
+
+        With `cache_size` rows are served from the cache until invalidated
+        (rows and their object/array values are copied so they can be
+        modified by the caller). Reads in a session don't use the cache.
+
+        # Arguments
+            bucket (str): bucket name
+            fields (str[]): names of fields to select (defaults to all)
+
+        # Returns
+            list[]: rows
+
+        """
+        # Sessions can read uncommitted rows which can't be shared
+        if self.__cache is None or self.__connection is not None:
+            return list(self.iter(bucket, fields=fields))
+        key = (bucket, tuple(fields) if fields is not None else None)
+        # Stamps are taken before reading so concurrent writes can't be cached
+        version = self.__cache.get_version(bucket)
+        stamp = self.__get_cache_stamp(bucket)
+        rows = self.__cache.get(key, stamp)
+        if rows is None:
+            rows = list(self.iter(bucket, fields=fields))
+            self.__cache.put(key, stamp, rows, version=version)
+        return [_copy_row(row) for row in rows]
 
     def write(self, bucket, rows, keyed=False, as_generator=False, update_keys=None,
-              buffer_size=1000, use_bloom_filter=True):
+              buffer_size=1000, use_bloom_filter=True, cast_workers=None,
+              update_strategy=None, results=None, coalesce=False,
+              commit_every=None, resume_token=None, parallel=None, parallel_commit='shard',
+              input='raw', trust=False, mode='append', sort_by=None, sort_memory='512MB'):
         """Write to bucket
 
         # Arguments
@@ -236,6 +636,71 @@ class Storage(tableschema.Storage):
             use_bloom_filter (bool=True):
                 should we use a bloom filter to optimize DB update performance
                 (in exchange for some setup time)
+            cast_workers (int):
+                number of processes to cast rows in parallel chunks of `buffer_size`
+                (a cast error exposes the original row index as `row_index`)
+            update_strategy (str):
+                with `staging` rows are bulk loaded to a temporary table and merged
+                with set-based UPDATE and INSERT statements joined on `update_keys`
+                (doesn't require unique keys; input rows with the same keys, nulls
+                included, are collapsed to the last one; SQLite/PostgreSQL only;
+                returns inserted, updated and collapsed counts)
+            results (str):
+                what is produced for written rows (one of):
+                  - `rows`: a `WrittenRow` per row (default with `as_generator`)
+                  - `batches`: a `WrittenBatch` per flushed buffer with inserted/updated
+                    counts and autoincrement ids of inserted rows as an `array`
+                  - `counts`: `WrittenCounts` with inserted/updated counts
+                  - `none`: nothing (default without `as_generator`)
+            coalesce (bool/callable):
+                merge rows with the same `update_keys` values within a buffer so
+                every key is written once per flush (the last row wins or the result
+                of a `merge(old_row, new_row)` function on keyed rows is written);
+                the number of merged rows is reported as `WrittenCounts.collapsed`
+            commit_every (int):
+                commit after every `commit_every` flushed buffers instead of
+                writing all rows in one transaction (not supported in a session)
+            resume_token (str):
+                record the number of written input rows with every commit under
+                this token; a write repeated with the same token skips that many
+                rows of its input (use a new token for a new input)
+            parallel (int):
+                number of writers on their own connections sharing converted rows
+                (sharded by `update_keys` or sent in batches round robin);
+                supports only `counts` and `none` results and writes serially
+                on SQLite where concurrent writers would wait for each other
+            parallel_commit (str):
+                with `shard` (default) every writer commits its own rows,
+                with `twophase` all writers commit or none using a two-phase
+                commit (requires `max_prepared_transactions` for PostgreSQL)
+            input (str):
+                with `raw` (default) values are cast by `tableschema`,
+                with `typed` values are already Python values of the field types
+                (e.g. `int`, `Decimal`, `date`, `dict`) and are only checked to be
+                instances of them; cast workers are not supported
+            trust (bool):
+                skip the instance check of `typed` input
+            mode (str):
+                with `append` (default) rows are added to the bucket,
+                with `replace` rows are loaded to a shadow table which gets the
+                bucket's indexes after the load and is swapped with the bucket's
+                table in one transaction, so readers never see a partial table
+                (not supported for buckets referenced by other buckets, partitioned
+                or temporary buckets, `update_keys` and resumable writes;
+                index names are kept on PostgreSQL and MySQL only)
+            sort_by (str/str[]):
+                field names or `primaryKey` to write rows sorted by their values
+                (nulls last) so indexed tables are appended to in key order
+                (`any`, `array`, `geojson` and `object` fields can't be sorted by)
+            sort_memory (int/str):
+                memory budget of sorting in bytes or as a string like `512MB`;
+                bigger inputs are sorted in runs spilled to temporary files
+                which are merged (64 at a time)
+
+        # Returns
+            WrittenCounts:
+                inserted, updated and collapsed counts for the `staging` strategy
+                or `results='counts'` without `as_generator`
 
         """
 
@@ -244,40 +709,734 @@ class Storage(tableschema.Storage):
             message = 'Argument "update_keys" cannot be an empty list'
             raise tableschema.exceptions.StorageError(message)
 
+        # Check results
+        if results is None:
+            results = 'rows' if as_generator else 'none'
+        if results not in ['rows', 'batches', 'counts', 'none']:
+            message = 'Results mode "%s" is not supported' % results
+            raise tableschema.exceptions.StorageError(message)
+
+        # Check coalesce
+        coalesce = self.__get_coalesce(coalesce, update_keys)
+
+        # Check update strategy
+        if update_strategy not in [None, 'staging']:
+            message = 'Update strategy "%s" is not supported' % update_strategy
+            raise tableschema.exceptions.StorageError(message)
+        if update_strategy == 'staging':
+            if update_keys is None or as_generator:
+                message = 'Update strategy "staging" requires "update_keys" and no generator'
+                raise tableschema.exceptions.StorageError(message)
+            if self.__dialect not in ['postgresql', 'sqlite']:
+                message = 'Update strategy "staging" is not supported for "%s"'
+                raise tableschema.exceptions.StorageError(message % self.__dialect)
+            use_bloom_filter = False
+            if commit_every is not None or resume_token is not None:
+                message = 'Update strategy "staging" doesn\'t support resumable writes'
+                raise tableschema.exceptions.StorageError(message)
+
+        # Check input
+        if input not in ['raw', 'typed']:
+            message = 'Input "%s" is not supported' % input
+            raise tableschema.exceptions.StorageError(message)
+        if input != 'typed' and trust:
+            message = 'Argument "trust" requires "typed" input'
+            raise tableschema.exceptions.StorageError(message)
+        if input == 'typed' and cast_workers:
+            message = 'Argument "cast_workers" is not supported for "typed" input'
+            raise tableschema.exceptions.StorageError(message)
+
+        # Check mode
+        if mode not in ['append', 'replace']:
+            message = 'Mode "%s" is not supported' % mode
+            raise tableschema.exceptions.StorageError(message)
+        if mode == 'replace' and (update_keys is not None or resume_token is not None):
+            message = 'Mode "replace" doesn\'t support "update_keys" and resumable writes'
+            raise tableschema.exceptions.StorageError(message)
+
+        # Check commits
+        if commit_every is not None:
+            if not isinstance(commit_every, int) or commit_every < 1:
+                message = 'Argument "commit_every" must be a positive integer'
+                raise tableschema.exceptions.StorageError(message)
+            if self.__connection is not None:
+                message = 'Argument "commit_every" is not supported in a session'
+                raise tableschema.exceptions.StorageError(message)
+
+        # Check parallel
+        if parallel is not None:
+            if not isinstance(parallel, int) or parallel < 1:
+                message = 'Argument "parallel" must be a positive integer'
+                raise tableschema.exceptions.StorageError(message)
+            if parallel_commit not in ['shard', 'twophase']:
+                message = 'Parallel commit "%s" is not supported' % parallel_commit
+                raise tableschema.exceptions.StorageError(message)
+            if (as_generator or results not in ['counts', 'none'] or update_strategy or
+                    commit_every is not None or resume_token is not None or
+                    self.__connection is not None):
+                message = ('Argument "parallel" supports only counts or none results '
+                    'without a generator, staging, resumable writes and sessions')
+                raise tableschema.exceptions.StorageError(message)
+            if self.__dialect == 'sqlite' or parallel == 1:
+                parallel = None
+
         # Get table and description
         table = self.__get_table(bucket)
         schema = tableschema.Schema(self.describe(bucket))
         fallbacks = self.__fallbacks.get(bucket, [])
 
-        # Write rows to table
+        # Load to a shadow table (created on the first iteration)
+        replaced = None
+        if mode == 'replace':
+            replaced = table
+            table, definitions = self.__define_shadow(bucket)
+
+        # Prepare row conversion
+        caster = None
         convert_row = partial(self.__mapper.convert_row, schema=schema, fallbacks=fallbacks)
+        if input == 'typed':
+            convert_row = self.__mapper.get_typed_row_converter(schema, fallbacks, trust=trust)
+        if cast_workers:
+            caster = Caster(schema.descriptor, fallbacks,
+                prefix=self.__prefix, dialect=self.__dialect,
+                workers=cast_workers, chunk_size=buffer_size)
+            convert_row = _identity
+
+        # Sort converted rows
+        if sort_by is not None:
+            sorter = Sorter(self.__get_sort_keys(sort_by, schema), sort_memory)
+            if caster is not None:
+                rows = caster.cast(rows, keyed=keyed)
+                caster = None
+            else:
+                if not keyed:
+                    names = schema.field_names
+                    rows = (dict(zip(names, row)) for row in rows)
+                rows = six.moves.map(convert_row, rows)
+            rows = sorter.sort(rows)
+            keyed = True
+            convert_row = _identity
+
+        # Write rows in parallel
+        if parallel:
+            if caster is not None:
+                rows = caster.cast(rows, keyed=keyed)
+                keyed = True
+            create_writer = partial(Writer,
+                table=table,
+                schema=schema,
+                update_keys=update_keys,
+                autoincrement=None,
+                convert_row=_identity,
+                buffer_size=buffer_size,
+                use_bloom_filter=use_bloom_filter,
+                coalesce=coalesce)
+            loader = ParallelWriter(self.__engine, create_writer, schema,
+                convert_row=convert_row,
+                update_keys=update_keys,
+                buffer_size=buffer_size,
+                workers=parallel,
+                partitioner=self.__get_partitioner(bucket),
+                twophase=parallel_commit == 'twophase',
+                bloom_table=table if use_bloom_filter else None)
+            def load():
+                yield loader.write(rows, keyed=keyed)
+            gen = load()
+            if replaced is not None:
+                gen = self.__replacing(replaced, table, definitions, gen)
+            gen = self.__invalidating(bucket, gen)
+            counts = next(gen)
+            collections.deque(gen, maxlen=0)
+            return counts if results == 'counts' else None
+
+        # Prepare writer
         autoincrement = self.__get_autoincrement_for_bucket(bucket)
-        writer = Writer(self.__engine, table, schema,
+        writer = Writer(self.__bind, table, schema,
             # Only PostgreSQL supports "returning" so we don't use autoincrement for all
             autoincrement=autoincrement if self.__dialect in ['postgresql'] else None,
             update_keys=update_keys,
             convert_row=convert_row,
             buffer_size=buffer_size,
-            use_bloom_filter=use_bloom_filter)
-        gen = writer.write(rows, keyed=keyed)
+            use_bloom_filter=use_bloom_filter,
+            key_snapshot=self.__get_key_snapshot(table, update_keys),
+            watermark=autoincrement,
+            partitioner=self.__get_partitioner(bucket),
+            coalesce=coalesce)
+
+        # Skip rows written before (before casting)
+        position = 0
+        if resume_token is not None:
+            position = writer.get_position(resume_token)
+            rows = itertools.islice(rows, position, None)
+
+        # Cast rows in parallel
+        if caster is not None:
+            rows = caster.cast(rows, keyed=keyed)
+            keyed = True
+
+        # Write rows to table
+        if update_strategy == 'staging':
+            counts = writer.merge(rows, keyed=keyed)
+            self.__invalidate(bucket)
+            return counts
+        gen = writer.write(rows, keyed=keyed, results=results,
+            commit_every=commit_every, resume_token=resume_token, position=position)
+        if replaced is not None:
+            gen = self.__replacing(replaced, table, definitions, gen)
+        gen = self.__invalidating(bucket, gen)
         if as_generator:
             return gen
+        if results == 'counts':
+            counts = next(gen)
+            collections.deque(gen, maxlen=0)
+            return counts
         collections.deque(gen, maxlen=0)
 
+    def delete_partitions(self, bucket, before=None, values=None):
+        """Drop partitions of a bucket partitioned by range or list
+
+        Dropping a partition is a fast alternative to deleting its rows.
+
+        # Arguments
+            bucket (str): bucket name
+            before (date/datetime/int):
+                drop range partitions holding only values lower than `before`
+            values (list): drop list partitions of these values
+
+        # Returns
+            str[]: names of dropped partitions
+
+        """
+        partitioner = self.__get_partitioner(bucket)
+        if partitioner is None:
+            message = 'Bucket "%s" is not partitioned by range or list' % bucket
+            raise tableschema.exceptions.StorageError(message)
+        with connect(self.__bind) as connection:
+            with begin(connection):
+                names = partitioner.drop(connection, before=before, values=values)
+        self.__invalidate(bucket)
+        return names
+
+    def writer(self, bucket, keyed=False, update_keys=None, buffer_size=1000,
+               use_bloom_filter=True, flush_size=None, flush_interval=None, coalesce=False):
+        """Get a reusable writer accepting rows over time
+
+        Schema, row converter and update keys index are prepared once.
+        Rows are flushed to the bucket when `flush_size` or `flush_interval`
+        is reached, on an explicit `flush()` or on closing the writer
+        (it can be used as a context manager).
+
+        # Arguments
+            keyed (bool): accept keyed rows
+            update_keys (str[]): see `storage.write`
+            buffer_size (int=1000): see `storage.write`
+            use_bloom_filter (bool=True): see `storage.write`
+            coalesce (bool/callable): see `storage.write`
+            flush_size (int):
+                number of pending rows triggering a flush (defaults to `buffer_size`)
+            flush_interval (float):
+                seconds since the last flush triggering a flush on the next write
+                (there is no timer: rows of an idle writer stay pending
+                until the next `write`, `flush` or `close`)
+
+        # Returns
+            BucketWriter: writer with `write(rows)`, `flush()` and `close()` methods
+
+        """
+
+        # Check update keys
+        if update_keys is not None and len(update_keys) == 0:
+            message = 'Argument "update_keys" cannot be an empty list'
+            raise tableschema.exceptions.StorageError(message)
+
+        # Get table and description
+        table = self.__get_table(bucket)
+        schema = tableschema.Schema(self.describe(bucket))
+        fallbacks = self.__fallbacks.get(bucket, [])
+        coalesce = self.__get_coalesce(coalesce, update_keys)
+
+        # Create writer
+        convert_row = partial(self.__mapper.convert_row, schema=schema, fallbacks=fallbacks)
+        autoincrement = self.__get_autoincrement_for_bucket(bucket)
+        writer = Writer(self.__bind, table, schema,
+            # Only PostgreSQL supports "returning" so we don't use autoincrement for all
+            autoincrement=autoincrement if self.__dialect in ['postgresql'] else None,
+            update_keys=update_keys,
+            convert_row=convert_row,
+            buffer_size=buffer_size,
+            use_bloom_filter=use_bloom_filter,
+            key_snapshot=self.__get_key_snapshot(table, update_keys),
+            watermark=autoincrement,
+            partitioner=self.__get_partitioner(bucket),
+            coalesce=coalesce)
+        bucket_writer = BucketWriter(writer, keyed=keyed,
+            flush_size=flush_size or buffer_size,
+            flush_interval=flush_interval,
+            on_flush=partial(self.__invalidate, bucket))
+        if self.__connection is not None:
+            self.__local.writers.append(bucket_writer)
+        return bucket_writer
+
+    def import_source(self, bucket, source, infer_sample=100, force=False,
+                      buffer_size=1000, **options):
+        """Import tabular source to a new bucket
+
+        Descriptor is inferred from a sample and the source is streamed
+        to the bucket in batches of positional rows.
+
+        # Arguments
+            source (any): `tabulator` source e.g. a path to a CSV file
+            infer_sample (int=100): number of rows to infer the descriptor from
+            force (bool): replace an existing bucket
+            buffer_size (int=1000): number of rows to write to the db in one batch
+            options (dict): `tabulator.Stream` options
+
+        # Returns
+            int: number of written rows
+
+        """
+        # Sample size includes headers row
+        headers = options.setdefault('headers', 1)
+        sample_size = infer_sample + (headers if isinstance(headers, int) else 0)
+
+        # Imported on first use
+        from tabulator import Stream
+        with Stream(source, sample_size=sample_size, **options) as stream:
+
+            # Create bucket
+            schema = tableschema.Schema()
+            descriptor = schema.infer(list(stream.sample), headers=stream.headers)
+            self.create(bucket, descriptor, force=force)
+
+            # Get table and description
+            table = self.__get_table(bucket)
+            schema = tableschema.Schema(descriptor)
+            fallbacks = self.__fallbacks.get(bucket, [])
+
+            # Write rows to table
+            convert_values = partial(
+                self.__mapper.convert_values, schema=schema, fallbacks=fallbacks)
+            writer = Writer(self.__bind, table, schema,
+                autoincrement=None,
+                update_keys=None,
+                convert_row=None,
+                buffer_size=buffer_size,
+                use_bloom_filter=False)
+            count = writer.write_values(map(convert_values, stream.iter()))
+            self.__invalidate(bucket)
+            return count
+
+    def export(self, bucket, fileobj, format='csv', batch_size=1000, copy=False,
+               on_batch=None):
+        """Export bucket to a file object
+
+        Rows are streamed from a server-side cursor without casting values
+        to `tableschema` types, serializers are chosen once per column.
+
+        # Arguments
+            fileobj (object): text file object to write to
+            format (str='csv'): output format (csv/ndjson)
+            batch_size (int=1000): number of rows to fetch and write at once
+            copy (bool):
+                use `COPY ... TO STDOUT` on PostgreSQL (only for CSV;
+                values are written in their PostgreSQL text representation)
+            on_batch (func):
+                called with the number of rows of every written batch
+                (once with all rows for `copy`) to report progress
+
+        # Returns
+            int: number of exported rows
+
+        """
+        table = self.__get_table(bucket)
+        schema = tableschema.Schema(self.describe(bucket))
+        exporter = Exporter(self.__bind, table, schema,
+            format=format, batch_size=batch_size)
+        if copy:
+            count = exporter.export_copy(fileobj)
+            if on_batch is not None:
+                on_batch(count)
+            return count
+        return exporter.export(fileobj, on_batch=on_batch)
+
+    def copy_to(self, target, buckets=None, workers=1, batch_size=1000, force=False):
+        """Copy buckets to another storage
+
+        Target buckets are created in foreign keys order and rows are streamed
+        in batches. Between the same dialects values are passed to the target
+        as read from the database, otherwise as `typed` input (see `write`).
+
+        # Arguments
+            target (Storage): target storage
+            buckets (str[]): buckets to copy (defaults to all)
+            workers (int=1):
+                number of buckets copied at the same time (only buckets not
+                referring to each other; one for SQLite and sessions)
+            batch_size (int=1000): number of rows to read and write in one batch
+            force (bool): replace existing target buckets
+
+        # Returns
+            dict: `CopiedBucket` with `rows`, `seconds` and `rows_per_second`
+            indexed by bucket names in the copying order
+
+        """
+
+        # Get buckets in foreign keys order
+        if buckets is None:
+            buckets = self.buckets
+        for bucket in buckets:
+            if bucket not in self.buckets:
+                message = 'Bucket "%s" doesn\'t exist.' % bucket
+                raise tableschema.exceptions.StorageError(message)
+        buckets = [bucket for bucket in self.buckets if bucket in buckets]
+        descriptors = [self.describe(bucket) for bucket in buckets]
+
+        # Create target buckets
+        target.create(buckets, descriptors, force=force)
+
+        # Get dependencies
+        dependencies = {}
+        for bucket, descriptor in zip(buckets, descriptors):
+            dependencies[bucket] = set(fk['reference']['resource']
+                for fk in descriptor.get('foreignKeys', [])
+                if fk['reference']['resource'] in buckets and
+                    fk['reference']['resource'] != bucket)
+
+        # Copy buckets serially
+        copied = collections.OrderedDict()
+        if 'sqlite' in [self.__dialect, target.__dialect] or \
+                self.__connection is not None or target.__connection is not None:
+            workers = 1
+        if workers == 1:
+            for bucket in buckets:
+                copied[bucket] = self.__copy_bucket(target, bucket, batch_size)
+            return copied
+
+        # Copy buckets in parallel once their dependencies are copied
+        running = {}
+        pending = list(buckets)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            while pending or running:
+                for bucket in list(pending):
+                    if len(running) < workers and dependencies[bucket].issubset(copied):
+                        future = executor.submit(self.__copy_bucket, target, bucket, batch_size)
+                        running[future] = bucket
+                        pending.remove(bucket)
+                done = wait(running, return_when=FIRST_COMPLETED).done
+                for future in done:
+                    copied[running.pop(future)] = future.result()
+
+        return copied
+
     # Private
 
+    @property
+    def __connection(self):
+        # Sessions are bound to the thread they are opened in
+        return getattr(self.__local, 'connection', None)
+
+    @property
+    def __bind(self):
+        return self.__connection if self.__connection is not None else self.__engine
+
     def __get_table(self, bucket):
         table_name = self.__mapper.convert_bucket(bucket)
+        if table_name in self.__temporary.tables:
+            return self.__temporary.tables[table_name]
         if self.__dbschema:
             table_name = '.'.join((self.__dbschema, table_name))
         return self.__metadata.tables[table_name]
 
     def __reflect(self):
+        partitions = set()
+        if self.__dialect == 'postgresql':
+            # Partitions are not buckets
+            with connect(self.__bind) as connection:
+                partitions.update(Partitioner.list_all(connection, self.__dbschema))
+
         def only(name, _):
+            if name in partitions or name == PROGRESS_TABLE:
+                return False
             return self.__only(name) and self.__mapper.restore_bucket(name) is not None
-        self.__metadata.reflect(only=only, bind=self.__engine)
+        if self.__reflect_catalog:
+            with connect(self.__bind) as connection:
+                catalog.reflect(connection, self.__metadata, only)
+            return
+        self.__metadata.reflect(only=only, bind=self.__bind)
+
+    def __copy_bucket(self, target, bucket, batch_size):
+        """Copy bucket rows to the same target bucket returning `CopiedBucket`
+        """
+        started = time.time()
+
+        # Same dialect: database values
+        if self.__dialect == target.__dialect:
+            table = self.__get_table(bucket)
+            schema = tableschema.Schema(target.describe(bucket))
+            columns = [getattr(table.c, name) for name in schema.field_names]
+            select = table.select().with_only_columns(*columns)
+            select = select.execution_options(stream_results=True, yield_per=batch_size)
+            writer = Writer(target.__bind, target.__get_table(bucket), schema,
+                autoincrement=None,
+                update_keys=None,
+                convert_row=None,
+                buffer_size=batch_size,
+                use_bloom_filter=False)
+            with connect(self.__bind) as connection:
+                count = writer.write_values(connection.execute(select))
+            target.__invalidate(bucket)
+
+        # Other dialects: typed values (autoincrement columns are not copied)
+        else:
+            schema = tableschema.Schema(target.describe(bucket))
+            counts = target.write(bucket, self.iter(bucket, fields=schema.field_names),
+                buffer_size=batch_size, input='typed', results='counts')
+            count = counts.inserted
+
+        seconds = time.time() - started
+        return CopiedBucket(count, seconds, count / seconds if seconds else None)
+
+    def __define_shadow(self, bucket):
+        """Define a shadow table of a bucket returning it with index definitions
+
+        The shadow table is created in the database by `__replacing`.
+        """
+        table = self.__get_table(bucket)
+        if table.metadata is self.__temporary or self.__get_partitioner(bucket) is not None:
+            message = 'Mode "replace" is not supported for temporary or partitioned bucket "%s"'
+            raise tableschema.exceptions.StorageError(message % bucket)
+        for other in self.__metadata.tables.values():
+            if other is not table and any(fk.references(table) for fk in other.foreign_keys):
+                message = 'Bucket "%s" is referenced by "%s" and can\'t be replaced'
+                raise tableschema.exceptions.StorageError(message % (bucket, other.name))
+
+        # Indexes are built after the load
+        descriptor = self.describe(bucket)
+        definitions = self.indexes(bucket)
+        shadow_bucket = '%s_shadow_%s' % (bucket, uuid.uuid4().hex[:8])
+        columns, constraints, _, _, comment = self.__mapper.convert_descriptor(
+            shadow_bucket, descriptor, [], self.__get_autoincrement_for_bucket(bucket))
+
+        # Enum types are named after the bucket's table and shared with it
+        if self.__dialect == 'postgresql':
+            from sqlalchemy.dialects.postgresql import ENUM
+            for column in columns:
+                if isinstance(column.type, sqlalchemy.Enum):
+                    column.type = ENUM(*column.type.enums, create_type=False,
+                        name='%s_%s_enum' % (table.name, column.name))
+
+        # Referred tables are only copied to resolve foreign keys
+        metadata = MetaData(schema=self.__dbschema)
+        for fk in descriptor.get('foreignKeys', []):
+            if fk['reference']['resource'] != '':
+                self.__get_table(fk['reference']['resource']).to_metadata(metadata)
+        shadow = Table(self.__mapper.convert_bucket(shadow_bucket), metadata,
+            *(columns + constraints), comment=comment)
+        return shadow, definitions
+
+    def __replacing(self, table, shadow, definitions, gen):
+        preparer = self.__engine.dialect.identifier_preparer
+        try:
+            for column in shadow.columns:
+                if isinstance(column.type, sqlalchemy.Enum):
+                    column.type.create(bind=self.__bind, checkfirst=True)
+            shadow.create(bind=self.__bind)
+            for item in gen:
+                yield item
+            self.__swap(table, shadow, definitions)
+        except BaseException:
+            # A session rolls back the shadow table itself
+            if self.__connection is None:
+                with connect(self.__engine) as connection:
+                    with begin(connection):
+                        connection.execute(sqlalchemy.text(
+                            'DROP TABLE IF EXISTS %s' % preparer.format_table(shadow)))
+            raise
+
+    def __swap(self, table, shadow, definitions):
+        """Index a loaded shadow table and swap it with the bucket's table
+        """
+        preparer = self.__engine.dialect.identifier_preparer
+        columns = dict((column.name, column) for column in shadow.columns)
+        with connect(self.__bind) as connection:
+
+            # Build indexes
+            renames = []
+            with begin(connection):
+                for index, definition in enumerate(definitions):
+                    definition = dict(definition)
+                    name = definition.pop('name', None)
+                    sa_index = self.__mapper.convert_index(
+                        shadow.name, index, definition, columns)
+                    if sa_index is not None:
+                        sa_index.create(bind=connection)
+                        if name:
+                            renames.append((sa_index.name, name))
+
+            # Swap tables
+            with begin_ddl(connection):
+                name = preparer.quote(table.name)
+                if self.__dialect == 'mysql':
+                    old = '%s_old_%s' % (table.name, uuid.uuid4().hex[:8])
+                    old = Table(old, MetaData(schema=table.schema))
+                    connection.execute(sqlalchemy.text('RENAME TABLE %s TO %s, %s TO %s' % (
+                        preparer.format_table(table), preparer.format_table(old),
+                        preparer.format_table(shadow), preparer.format_table(table))))
+                    connection.execute(sqlalchemy.text(
+                        'DROP TABLE %s' % preparer.format_table(old)))
+                    for shadow_name, index_name in renames:
+                        connection.execute(sqlalchemy.text(
+                            'ALTER TABLE %s RENAME INDEX %s TO %s' % (
+                                preparer.format_table(table),
+                                preparer.quote(shadow_name), preparer.quote(index_name))))
+                else:
+                    connection.execute(sqlalchemy.text(
+                        'DROP TABLE %s' % preparer.format_table(table)))
+                    connection.execute(sqlalchemy.text('ALTER TABLE %s RENAME TO %s' % (
+                        preparer.format_table(shadow), name)))
+                    if self.__dialect == 'postgresql':
+                        # Enum types not shared with the shadow table
+                        shared = set(column.type.name for column in shadow.columns
+                            if isinstance(column.type, sqlalchemy.Enum))
+                        for column in table.columns:
+                            if isinstance(column.type, sqlalchemy.Enum) and \
+                                    column.type.name not in shared:
+                                column.type.drop(bind=connection, checkfirst=True)
+                        for shadow_name, index_name in renames:
+                            shadow_name = preparer.quote(shadow_name)
+                            if table.schema:
+                                shadow_name = '%s.%s' % (
+                                    preparer.quote_schema(table.schema), shadow_name)
+                            connection.execute(sqlalchemy.text('ALTER INDEX %s RENAME TO %s' % (
+                                shadow_name, preparer.quote(index_name))))
+
+                # Update metadata
+                self.__metadata.remove(table)
+                Table(table.name, self.__metadata, autoload_with=connection)
+
+        # Remove key snapshots
+        self.__remove_key_snapshots(table)
+
+    def __remove_key_snapshots(self, table):
+        if self.__key_snapshots is None:
+            return
+        # A session removes them after the commit
+        if self.__connection is not None:
+            self.__local.removals.append(table.fullname)
+            return
+        KeySnapshot.remove_all(self.__key_snapshots, table.fullname)
+
+    def __get_durability_prefixes(self, durability):
+        if durability is None:
+            return []
+        if durability == 'unlogged' and self.__dialect == 'postgresql':
+            return ['UNLOGGED']
+        if durability == 'temporary':
+            return ['TEMPORARY']
+        message = 'Durability "%s" is not supported for "%s"' % (durability, self.__dialect)
+        raise tableschema.exceptions.StorageError(message)
+
+    def __get_sort_keys(self, sort_by, schema):
+        keys = sort_by
+        if sort_by == 'primaryKey':
+            keys = schema.primary_key
+        elif isinstance(sort_by, six.string_types):
+            keys = [sort_by]
+        if not keys or any(schema.get_field(name) is None for name in keys):
+            message = 'Sorting by "%s" is not valid' % sort_by
+            raise tableschema.exceptions.StorageError(message)
+        # Values of these types are not ordered
+        for name in keys:
+            if schema.get_field(name).type in ['any', 'array', 'geojson', 'object']:
+                message = 'Sorting by "%s" field "%s" is not supported'
+                raise tableschema.exceptions.StorageError(
+                    message % (schema.get_field(name).type, name))
+        return keys
+
+    def __get_coalesce(self, coalesce, update_keys):
+        if not coalesce:
+            return None
+        if update_keys is None:
+            message = 'Argument "coalesce" requires "update_keys"'
+            raise tableschema.exceptions.StorageError(message)
+        return coalesce if callable(coalesce) else _last_row
+
+    def __get_lookup(self, bucket, table, key_fields):
+        key = (bucket, tuple(key_fields))
+        lookup = self.__lookups.get(key)
+        if lookup is None or lookup[0] is not table:
+            columns = [getattr(table.c, name) for name in key_fields]
+            expression = columns[0] if len(columns) == 1 else sqlalchemy.tuple_(*columns)
+            statement = table.select().where(
+                expression.in_(sqlalchemy.bindparam('keys', expanding=True)))
+            lookup = self.__lookups[key] = (table, statement)
+        return lookup[1]
+
+    def __forget_temporary(self, keep):
+        for table in list(self.__temporary.sorted_tables):
+            if table.key not in keep:
+                bucket = self.__mapper.restore_bucket(table.name)
+                self.__temporary.remove(table)
+                self.__descriptors.pop(bucket, None)
+                self.__partitioners.pop(bucket, None)
+                self.__invalidate(bucket)
+
+    def __invalidate(self, bucket=None):
+        if self.__cache is not None:
+            self.__cache.invalidate(bucket)
+
+    def __invalidating(self, bucket, gen):
+        try:
+            for item in gen:
+                yield item
+        finally:
+            self.__invalidate(bucket)
+
+    def __get_cache_stamp(self, bucket):
+        if self.__cache_check is None:
+            return None
+        table = self.__get_table(bucket)
+        aggregates = [sqlalchemy.func.count()]
+        autoincrement = self.__get_autoincrement_for_bucket(bucket)
+        if self.__cache_check == 'autoincrement' and autoincrement is not None:
+            aggregates.append(sqlalchemy.func.max(getattr(table.c, autoincrement)))
+        select = sqlalchemy.select(*aggregates).select_from(table)
+        with connect(self.__bind) as connection:
+            return tuple(connection.execute(select).one())
+
+    def __get_partitioner(self, bucket):
+        if self.__dialect != 'postgresql':
+            return None
+        if bucket not in self.__partitioners:
+            table = self.__get_table(bucket)
+            field_types = dict((field['name'], field.get('type', 'string'))
+                for field in self.describe(bucket)['fields'])
+            with connect(self.__bind) as connection:
+                self.__partitioners[bucket] = Partitioner.reflect(
+                    connection, table.name, self.__dbschema, field_types)
+        return self.__partitioners[bucket]
+
+    def __get_key_snapshot(self, table, update_keys):
+        if self.__key_snapshots is None or update_keys is None:
+            return None
+        return KeySnapshot(self.__key_snapshots, table.fullname, update_keys)
 
     def __get_autoincrement_for_bucket(self, bucket):
         if isinstance(self.__autoincrement, dict):
             return self.__autoincrement.get(bucket)
         return self.__autoincrement
+
+
+# Internal
+
+def _identity(row):
+    return row
+
+
+def _copy_row(row):
+    return [copy.deepcopy(value) if isinstance(value, (dict, list)) else value
+        for value in row]
+
+
+def _last_row(old_row, new_row):
+    return new_row
@@ -4,9 +4,21 @@ from __future__ import print_function
 from __future__ import absolute_import
 from __future__ import unicode_literals
 
-import pybloom_live
+import time
+import uuid
+import array
+import threading
+import itertools
+import collections
+import tableschema
+import sqlalchemy as sa
 from collections import namedtuple
+from .helpers import connect, begin, begin_restartable
+PROGRESS_TABLE = 'tableschema_sql_progress'
+SNAPSHOT_INTERVAL = 60
 WrittenRow = namedtuple('WrittenRow', ['row', 'updated', 'updated_id'])
+WrittenCounts = namedtuple('WrittenCounts', ['inserted', 'updated', 'collapsed'])
+WrittenBatch = namedtuple('WrittenBatch', ['inserted', 'updated', 'ids'])
 
 
 # Module API
@@ -17,8 +29,20 @@ class Writer(object):
 
     def __init__(self, engine, table, schema, update_keys,
                  autoincrement, convert_row, buffer_size,
-                 use_bloom_filter):
+                 use_bloom_filter, key_snapshot=None, watermark=None, partitioner=None,
+                 coalesce=None, bloom=None):
         """Writer to insert/update rows into table
+
+        With `key_snapshot` the bloom filter is loaded from a persisted snapshot
+        and only rows added since (after the `watermark` autoincrement column
+        value or, without it, if the row count is unchanged) are scanned. As
+        foreign writers can add keys the snapshot misses (e.g. keeping the row
+        count or committing out of order), keys missing in the bloom filter are
+        checked in the table with one query per flush.
+        With `partitioner` missing partitions are created before rows are written.
+        With `coalesce` (a `merge(old_row, new_row)` function) rows with the same
+        update keys are merged within the buffer and written once per flush.
+        With `bloom` (see `prepare_blooms`) the table isn't scanned for keys.
         """
         self.__engine = engine
         self.__table = table
@@ -29,69 +53,383 @@ class Writer(object):
         self.__buffer = []
         self.__buffer_size = buffer_size
         self.__use_bloom_filter = use_bloom_filter
-        if update_keys is not None and use_bloom_filter:
-            with self.__engine.connect() as connection:
+        self.__key_snapshot = key_snapshot
+        self.__watermark = watermark
+        self.__partitioner = partitioner
+        self.__coalesce = coalesce
+        self.__pending = {}
+        self.__updates = collections.OrderedDict()
+        self.__progress = _get_progress_table(table)
+        self.__uncommitted = 0
+        self.__stamp = None
+        self.__saved = None
+        self.__inserted = 0
+        if update_keys is None or not use_bloom_filter or bloom is not None:
+            self.__key_snapshot = None
+        if update_keys is not None and use_bloom_filter and bloom is not None:
+            self.__bloom = bloom
+        elif update_keys is not None and use_bloom_filter:
+            with connect(self.__engine) as connection:
                 self.__prepare_bloom(connection)
 
-    def write(self, rows, keyed=False):
+    def write(self, rows, keyed=False, results='rows', commit_every=None,
+              resume_token=None, position=0):
         """Write rows/keyed_rows to table
+
+        Yields depending on `results`:
+        - rows: a `WrittenRow` per row
+        - batches: a `WrittenBatch` per flushed buffer
+        - counts: a single `WrittenCounts` at the end
+        - none: nothing
+
+        With `commit_every` the transaction is committed (and a new one begun)
+        once `commit_every` buffers of rows are written. With `resume_token` the
+        number of input rows written (counting `position` rows skipped by the
+        caller) is saved in the progress table with every commit.
         """
-        with self.__engine.connect() as connection:
-            with connection.begin():
-                for row in rows:
+        self.__counts = [0, 0, 0]
+        self.__batch_updated = 0
+        self.__buffer = []
+        self.__pending = {}
+        self.__updates = collections.OrderedDict()
+        self.__uncommitted = 0
+        self.__commit_size = (commit_every or 0) * self.__buffer_size
+        self.__resume_token = resume_token
+        with connect(self.__engine) as connection:
+            transaction = begin_restartable(connection) if commit_every else begin(connection)
+            with transaction as commit:
+                for position, row in enumerate(rows, position + 1):
                     keyed_row = row
                     if not keyed:
                         keyed_row = dict(zip(self.__schema.field_names, row))
                     keyed_row = self.__convert_row(keyed_row)
+                    if self.__coalesce is not None:
+                        if self.__buffer_coalesced(keyed_row):
+                            for wr in self.__flush(connection, results):
+                                yield wr
+                            self.__checkpoint(connection, commit, position)
+                        continue
                     if self.__check_existing(keyed_row):
-                        for wr in self.__insert(connection):
+                        for wr in self.__flush(connection, results):
                             yield wr
                         ret = self.__update(connection, keyed_row)
                         if ret is not None:
-                            yield WrittenRow(keyed_row, True, ret if self.__autoincrement else None)
+                            self.__counts[1] += 1
+                            self.__batch_updated += 1
+                            self.__uncommitted += 1
+                            if results == 'rows':
+                                yield WrittenRow(keyed_row, True,
+                                    ret if self.__autoincrement else None)
+                            self.__checkpoint(connection, commit, position)
                             continue
                     self.__buffer.append(keyed_row)
                     if len(self.__buffer) > self.__buffer_size:
-                        for wr in self.__insert(connection):
+                        for wr in self.__flush(connection, results):
                             yield wr
-                for wr in self.__insert(connection):
+                        self.__checkpoint(connection, commit, position)
+                for wr in self.__flush(connection, results):
                     yield wr
+                if results == 'batches' and self.__batch_updated:
+                    yield WrittenBatch(0, self.__batch_updated, None)
+                if resume_token is not None:
+                    self.__save_position(connection, position)
+                if self.__key_snapshot is not None:
+                    self.__update_stamp(connection)
+        # Saved after commit at most once per interval
+        if self.__key_snapshot is not None:
+            self.save_snapshot(force=False)
+        if results == 'counts':
+            yield WrittenCounts(*self.__counts)
+
+    def get_position(self, resume_token):
+        """Get the number of input rows written with a resume token
+
+        The progress table is created if it doesn't exist.
+        """
+        with connect(self.__engine) as connection:
+            with begin(connection):
+                self.__progress.create(connection, checkfirst=True)
+                select = sa.select(self.__progress.c.position).where(
+                    self.__get_progress_filter(resume_token))
+                return connection.execute(select).scalar() or 0
+
+    def merge(self, rows, keyed=False):
+        """Write rows/keyed_rows to table using a staging table
+
+        Rows are bulk loaded to a temporary table and merged with one
+        set-based UPDATE and one INSERT ... SELECT ... WHERE NOT EXISTS.
+        Rows with the same update keys (nulls included) are collapsed
+        to the last one before merging.
+        """
+        names = self.__schema.field_names
+        with connect(self.__engine) as connection:
+            with begin(connection):
+
+                # Create staging table
+                staging = _create_staging_table(connection, self.__table, names)
+
+                # Load rows
+                insert = _get_values_inserter(connection, staging, list(staging.columns))
+                positions = itertools.count()
+                rows = iter(rows)
+                while True:
+                    batch = []
+                    for row in itertools.islice(rows, self.__buffer_size):
+                        keyed_row = row
+                        if not keyed:
+                            keyed_row = dict(zip(names, row))
+                        keyed_row = self.__convert_row(keyed_row)
+                        batch.append(keyed_row)
+                    if not batch:
+                        break
+                    if self.__partitioner is not None:
+                        self.__partitioner.ensure(connection, batch)
+                    insert([[keyed_row.get(name) for name in names] + [next(positions)]
+                        for keyed_row in batch])
+
+                # Collapse rows with the same keys (the last one wins)
+                position = getattr(staging.c, _STAGING_POSITION)
+                keys = [getattr(staging.c, key) for key in self.__update_keys]
+                latest = sa.select(sa.func.max(position)).group_by(*keys)
+                result = connection.execute(staging.delete().where(position.not_in(latest)))
+                collapsed = result.rowcount
+
+                # Update existing rows
+                match = sa.and_(*[_match(getattr(self.__table.c, key), getattr(staging.c, key))
+                    for key in self.__update_keys])
+                values = dict((name, getattr(staging.c, name))
+                    for name in names if name not in self.__update_keys)
+                if not values:
+                    values = dict((name, getattr(staging.c, name)) for name in names)
+                result = connection.execute(self.__table.update().values(values).where(match))
+                updated = result.rowcount
+
+                # Insert new rows
+                select = sa.select(*[getattr(staging.c, name) for name in names]).where(
+                    ~sa.exists().where(match))
+                result = connection.execute(self.__table.insert().from_select(names, select))
+                inserted = result.rowcount
+
+                # Drop staging table
+                staging.drop(connection)
+
+        return WrittenCounts(inserted, updated, collapsed)
+
+    def save_snapshot(self, force=True):
+        """Persist the update keys index if a key snapshot is used
+
+        Without `force` the index is saved only if it wasn't saved
+        in the last `SNAPSHOT_INTERVAL` seconds.
+        """
+        if self.__key_snapshot is not None:
+            if self.__stamp is None:
+                self.__key_snapshot.remove()
+                return
+            if not force and self.__saved is not None:
+                if time.time() - self.__saved < SNAPSHOT_INTERVAL:
+                    return
+            count, watermark = self.__stamp
+            self.__key_snapshot.save(self.__bloom, count, watermark)
+            self.__saved = time.time()
+
+    @staticmethod
+    def prepare_blooms(engine, table, update_keys, count, get_index):
+        """Prepare `count` bloom filters of existing keys with one table scan
+
+        Every key is added to the bloom filter at `get_index(key)`.
+        """
+        blooms = [_create_bloom() for _ in range(count)]
+        columns = [getattr(table.c, key) for key in update_keys]
+        select = sa.select(*columns).execution_options(stream_results=True)
+        with connect(engine) as connection:
+            for key in connection.execute(select):
+                key = tuple(key)
+                blooms[get_index(key)].add(key)
+        return blooms
+
+    def write_values(self, rows):
+        """Write converted positional rows to table using the fastest insert path
+        """
+        count = 0
+        columns = [getattr(self.__table.c, name) for name in self.__schema.field_names]
+        with connect(self.__engine) as connection:
+            with begin(connection):
+                insert = _get_values_inserter(connection, self.__table, columns)
+                rows = iter(rows)
+                while True:
+                    batch = list(itertools.islice(rows, self.__buffer_size))
+                    if not batch:
+                        break
+                    insert(batch)
+                    count += len(batch)
+        return count
 
     # Private
 
     def __prepare_bloom(self, connection):
         """Prepare bloom for existing checks
         """
-        self.__bloom = pybloom_live.ScalableBloomFilter()
-        columns = [getattr(self.__table.c, key) for key in self.__update_keys]
-        keys = connection.execute(self.__table.select().with_only_columns(*columns).execution_options(stream_results=True))
-        for key in keys:
-            self.__bloom.add(tuple(key))
+        bloom = None
+        select = self.__table.select()
+        snapshot = self.__key_snapshot.load() if self.__key_snapshot is not None else None
 
-    def __insert(self, connection):
-        """Insert rows to table
+        # Key snapshot stamped with a high-water mark
+        if self.__watermark is not None and self.__key_snapshot is not None:
+            column = getattr(self.__table.c, self.__watermark)
+            current = connection.execute(sa.select(sa.func.max(column))).scalar()
+            if current is not None:
+                select = select.where(column <= current)
+                if snapshot is not None and snapshot[2] is not None and snapshot[2] <= current:
+                    bloom = snapshot[0]
+                    select = select.where(column > snapshot[2])
+            self.__stamp = (None, current)
+
+        # Key snapshot stamped with a row count
+        elif self.__key_snapshot is not None:
+            count = self.__count(connection)
+            if snapshot is not None and snapshot[1] == count:
+                bloom = snapshot[0]
+                select = None
+            self.__stamp = (count, None)
+
+        # Scan keys
+        if bloom is None:
+            bloom = _create_bloom()
+        self.__bloom = bloom
+        if select is not None:
+            columns = [getattr(self.__table.c, key) for key in self.__update_keys]
+            select = select.with_only_columns(*columns).execution_options(stream_results=True)
+            for key in connection.execute(select):
+                self.__bloom.add(tuple(key))
+
+    def __update_stamp(self, connection):
+        """Update key snapshot stamp after writing detecting foreign writers
         """
-        if len(self.__buffer) > 0:
-            # Insert data
-            statement = self.__table.insert()
-            if self.__autoincrement:
-                statement = statement.returning(
-                    getattr(self.__table.c, self.__autoincrement))
-                statement = statement.values(self.__buffer)
-                res = connection.execute(statement)
-                for id, in res:
-                    row = self.__buffer.pop(0)
-                    yield WrittenRow(row, False, id)
+        inserted = self.__inserted
+        self.__inserted = 0
+        if self.__stamp is None:
+            return
+        count, watermark = self.__stamp
+
+        # High-water mark: advance only if all new rows are ours
+        # (otherwise foreign rows will be scanned on the next load)
+        if self.__watermark is not None:
+            column = getattr(self.__table.c, self.__watermark)
+            select = sa.select(sa.func.count(), sa.func.max(column))
+            if watermark is not None:
+                select = select.where(column > watermark)
+            added, current = connection.execute(select).one()
+            if added == inserted and current is not None:
+                self.__stamp = (None, current)
+            return
+
+        # Row count: invalidate if it doesn't match our inserts
+        current = self.__count(connection)
+        self.__stamp = (current, None) if count + inserted == current else None
+
+    def __checkpoint(self, connection, commit, position):
+        """Commit if enough rows are written saving the input position
+        """
+        if commit is None or self.__uncommitted < self.__commit_size:
+            return
+        if self.__resume_token is not None:
+            self.__save_position(connection, position)
+        commit()
+        self.__uncommitted = 0
+
+    def __save_position(self, connection, position):
+        where = self.__get_progress_filter(self.__resume_token)
+        update = self.__progress.update().where(where).values(position=position)
+        if connection.execute(update).rowcount == 0:
+            connection.execute(self.__progress.insert().values(
+                table_name=self.__table.name, token=self.__resume_token, position=position))
+
+    def __get_progress_filter(self, resume_token):
+        return sa.and_(
+            self.__progress.c.table_name == self.__table.name,
+            self.__progress.c.token == resume_token)
+
+    def __count(self, connection):
+        select = sa.select(sa.func.count()).select_from(self.__table)
+        return connection.execute(select).scalar()
+
+    def __buffer_coalesced(self, keyed_row):
+        """Buffer row merging it with a pending row of the same key
+
+        Returns True if the buffer has to be flushed.
+        """
+        key = tuple(keyed_row[name] for name in self.__update_keys)
+        index = self.__pending.get(key)
+        if key in self.__pending:
+            self.__counts[2] += 1
+            if index is None:
+                self.__updates[key] = self.__coalesce(self.__updates[key], keyed_row)
             else:
-                connection.execute(statement, self.__buffer)
-                for row in self.__buffer:
-                    yield WrittenRow(row, False, None)
-            # Clean memory
-            self.__buffer = []
+                self.__buffer[index] = self.__coalesce(self.__buffer[index], keyed_row)
+            return False
+        if self.__check_existing(keyed_row):
+            self.__pending[key] = None
+            self.__updates[key] = keyed_row
+        else:
+            self.__pending[key] = len(self.__buffer)
+            self.__buffer.append(keyed_row)
+        return len(self.__buffer) + len(self.__updates) > self.__buffer_size
+
+    def __flush(self, connection, results):
+        """Update and insert buffered rows yielding results
+        """
+        self.__pending = {}
+        if self.__key_snapshot is not None and len(self.__buffer) > 0:
+            self.__check_missing(connection)
+        if len(self.__updates) > 0:
+            updates = self.__updates
+            self.__updates = collections.OrderedDict()
+            for keyed_row in updates.values():
+                ret = self.__update(connection, keyed_row)
+                if ret is None:
+                    # Bloom filter false positive
+                    self.__buffer.append(keyed_row)
+                    continue
+                self.__counts[1] += 1
+                self.__batch_updated += 1
+                self.__uncommitted += 1
+                if results == 'rows':
+                    yield WrittenRow(keyed_row, True, ret if self.__autoincrement else None)
+        if len(self.__buffer) > 0:
+            rows, ids = self.__insert(connection)
+            self.__counts[0] += len(rows)
+            self.__uncommitted += len(rows)
+            if results == 'rows':
+                for index, row in enumerate(rows):
+                    yield WrittenRow(row, False, ids[index] if ids is not None else None)
+            elif results == 'batches':
+                ids = array.array('q', ids) if ids is not None else None
+                yield WrittenBatch(len(rows), self.__batch_updated, ids)
+                self.__batch_updated = 0
+
+    def __insert(self, connection):
+        """Insert buffered rows to table returning them with autoincrement ids
+        """
+        rows = self.__buffer
+        self.__buffer = []
+        self.__inserted += len(rows)
+        if self.__partitioner is not None:
+            self.__partitioner.ensure(connection, rows)
+        statement = self.__table.insert()
+        if self.__autoincrement:
+            statement = statement.returning(
+                getattr(self.__table.c, self.__autoincrement))
+            statement = statement.values(rows)
+            ids = [id for id, in connection.execute(statement)]
+            return rows, ids
+        connection.execute(statement, rows)
+        return rows, None
 
     def __update(self, connection, row):
         """Update rows in table
         """
+        if self.__partitioner is not None:
+            self.__partitioner.ensure(connection, [row])
         expr = self.__table.update().values(row)
         for key in self.__update_keys:
             expr = expr.where(getattr(self.__table.c, key) == row[key])
@@ -106,6 +444,31 @@ class Writer(object):
             return 0
         return None
 
+    def __check_missing(self, connection):
+        """Move buffered rows with keys existing in table to updates
+        """
+        columns = [getattr(self.__table.c, key) for key in self.__update_keys]
+        keys = set(tuple(row[key] for key in self.__update_keys) for row in self.__buffer)
+        keys = [key for key in keys if None not in key]
+        if not keys:
+            return
+        if len(columns) == 1:
+            where = columns[0].in_([key[0] for key in keys])
+        else:
+            where = sa.tuple_(*columns).in_(keys)
+        select = sa.select(*columns).where(where)
+        existing = set(tuple(key) for key in connection.execute(select))
+        if not existing:
+            return
+        buffer = self.__buffer
+        self.__buffer = []
+        for keyed_row in buffer:
+            key = tuple(keyed_row[name] for name in self.__update_keys)
+            if key in existing:
+                self.__updates[key] = keyed_row
+            else:
+                self.__buffer.append(keyed_row)
+
     def __check_existing(self, row):
         """Check if row exists in table
         """
@@ -119,3 +482,204 @@ class Writer(object):
             else:
                 return True
         return False
+
+
+class BucketWriter(object):
+
+    # Public
+
+    def __init__(self, writer, keyed, flush_size, flush_interval, on_flush=None):
+        """Long-lived writer micro-batching rows across calls
+
+        Thresholds are checked on `write` only, so `flush_interval` doesn't
+        flush an idle writer. Rows of a failed flush stay pending for a retry.
+        The writer can be shared by threads: pending rows are swapped out
+        under a lock and flushes are written one at a time.
+        """
+        self.__writer = writer
+        self.__on_flush = on_flush
+        self.__keyed = keyed
+        self.__flush_size = flush_size
+        self.__flush_interval = flush_interval
+        self.__pending = []
+        self.__flushed = time.time()
+        self.__expired = False
+        self.__lock = threading.Lock()
+        self.__flush_lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        if type is None:
+            self.close()
+
+    @property
+    def pending(self):
+        """Number of rows waiting to be flushed
+        """
+        return len(self.__pending)
+
+    def write(self, rows):
+        """Add rows/keyed_rows flushing them if a threshold is reached
+        """
+        with self.__lock:
+            self.__check_expired()
+            self.__pending.extend(rows)
+            due = len(self.__pending) >= self.__flush_size
+            if self.__flush_interval is not None:
+                due = due or time.time() - self.__flushed >= self.__flush_interval
+        if due:
+            return self.flush()
+        return 0
+
+    def flush(self):
+        """Write pending rows to table returning the number of written rows
+        """
+        with self.__flush_lock:
+            with self.__lock:
+                self.__check_expired()
+                rows = self.__pending
+                self.__pending = []
+            if rows:
+                try:
+                    gen = self.__writer.write(rows, keyed=self.__keyed, results='none')
+                    collections.deque(gen, maxlen=0)
+                except Exception:
+                    # Kept ahead of rows added since for a retry
+                    with self.__lock:
+                        self.__pending = rows + self.__pending
+                    raise
+                if self.__on_flush is not None:
+                    self.__on_flush()
+            self.__flushed = time.time()
+            return len(rows)
+
+    def close(self):
+        """Flush pending rows and save the key snapshot
+        """
+        count = self.flush()
+        with self.__flush_lock:
+            self.__writer.save_snapshot()
+        return count
+
+    def expire(self):
+        """Discard pending rows and refuse further writes
+
+        Used when the session connection the writer is bound to ends.
+        """
+        with self.__lock:
+            self.__pending = []
+            self.__expired = True
+
+    # Private
+
+    def __check_expired(self):
+        if self.__expired:
+            message = 'Writer is bound to a session which has ended'
+            raise tableschema.exceptions.StorageError(message)
+
+
+# Internal
+
+_STAGING_POSITION = 'tableschema_sql_position'
+
+
+def _create_bloom():
+    # Imported on first use
+    import pybloom_live
+    return pybloom_live.ScalableBloomFilter()
+
+
+def _create_staging_table(connection, table, names):
+    """Create a temporary table with the given table columns and an input position
+    """
+    columns = []
+    for name in names:
+        type = getattr(table.c, name).type
+        if isinstance(type, sa.Enum) and connection.dialect.name == 'postgresql':
+            # Reuse the existing enum type
+            from sqlalchemy.dialects.postgresql import ENUM
+            type = ENUM(*type.enums, name=type.name, create_type=False)
+        columns.append(sa.Column(name, type))
+    columns.append(sa.Column(_STAGING_POSITION, sa.BigInteger))
+    name = '%s_staging_%s' % (table.name, uuid.uuid4().hex[:8])
+    staging = sa.Table(name, sa.MetaData(), *columns, prefixes=['TEMPORARY'])
+    staging.create(connection)
+    return staging
+
+
+def _match(column, staging_column):
+    """Compare a table column with a staging column treating nulls as equal
+    """
+    # Null-safe comparison is kept for nullable columns as it prevents hash joins
+    if not column.nullable:
+        return column == staging_column
+    return column.is_not_distinct_from(staging_column)
+
+
+def _get_progress_table(table):
+    """Get the table of input positions written with resume tokens
+    """
+    return sa.Table(PROGRESS_TABLE, sa.MetaData(),
+        sa.Column('table_name', sa.String(255), primary_key=True),
+        sa.Column('token', sa.String(255), primary_key=True),
+        sa.Column('position', sa.BigInteger, nullable=False),
+        schema=table.schema)
+
+
+def _get_values_inserter(connection, table, columns):
+    """Get a function inserting a batch of positional rows
+
+    Bind processors are resolved once per column and values are passed
+    to the driver as tuples instead of building a dict per row.
+    """
+    dialect = connection.dialect
+    preparer = dialect.identifier_preparer
+    processors = [column.type.dialect_impl(dialect).bind_processor(dialect) for column in columns]
+    processors = [(index, processor)
+        for index, processor in enumerate(processors) if processor is not None]
+    names = ', '.join(preparer.quote(column.name) for column in columns)
+    prefix = 'INSERT INTO %s (%s) VALUES ' % (preparer.format_table(table), names)
+
+    def process(batch):
+        if not processors:
+            return [tuple(row) for row in batch]
+        result = []
+        for row in batch:
+            row = list(row)
+            for index, processor in processors:
+                row[index] = processor(row[index])
+            result.append(tuple(row))
+        return result
+
+    # PostgreSQL/psycopg2: multi-row VALUES
+    if dialect.driver == 'psycopg2':
+        from psycopg2.extras import execute_values
+        def insert(batch):
+            cursor = connection.connection.cursor()
+            try:
+                execute_values(cursor, prefix + '%s', process(batch), page_size=len(batch))
+            finally:
+                cursor.close()
+        return insert
+
+    # Positional paramstyles: driver's executemany
+    placeholders = None
+    if dialect.paramstyle == 'qmark':
+        placeholders = ['?'] * len(columns)
+    elif dialect.paramstyle in ['format', 'pyformat']:
+        placeholders = ['%s'] * len(columns)
+    elif dialect.paramstyle == 'numeric':
+        placeholders = [':%s' % number for number in range(1, len(columns) + 1)]
+    if placeholders is not None:
+        sql = prefix + '(%s)' % ', '.join(placeholders)
+        def insert(batch):
+            connection.exec_driver_sql(sql, process(batch))
+        return insert
+
+    # Other drivers: sqlalchemy executemany
+    names = [column.name for column in columns]
+    def insert(batch):
+        connection.execute(table.insert(), [dict(zip(names, row)) for row in batch])
+    return insert
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+from __future__ import division
+from __future__ import print_function
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import io
+import json
+from click.testing import CliRunner
+from sqlalchemy import create_engine
+from tableschema_sql import Storage
+from tableschema_sql.cli import cli
+
+
+# Tests
+
+def test_cli_help():
+    result = CliRunner().invoke(cli, ['--help'])
+    assert result.exit_code == 0
+    assert 'Load, dump and inspect Table Schema buckets' in result.output
+
+
+def test_cli_load_list_describe_dump(tmpdir):
+    url = 'sqlite:///%s' % tmpdir.join('database.db')
+    runner = CliRunner()
+
+    # Load
+    result = runner.invoke(cli, ['load', url,
+        'data/articles.csv', 'data/comments.csv',
+        '--prefix', 'test_cli_', '--workers', '2', '--batch-size', '1'])
+    assert result.exit_code == 0
+    assert 'Loaded 3 rows' in result.output
+    storage = Storage(create_engine(url), prefix='test_cli_')
+    assert storage.read('comments') == [[1, 'good']]
+
+    # List
+    result = runner.invoke(cli, ['list', url, '--prefix', 'test_cli_'])
+    assert result.exit_code == 0
+    assert result.output.split() == ['articles', 'comments']
+
+    # Describe
+    result = runner.invoke(cli, ['describe', url, 'comments', '--prefix', 'test_cli_'])
+    assert result.exit_code == 0
+    assert json.loads(result.output) == storage.describe('comments')
+
+    # Dump
+    directory = tmpdir.join('dump')
+    result = runner.invoke(cli, ['dump', url, str(directory),
+        '--prefix', 'test_cli_', '--workers', '2', '--batch-size', '1'])
+    assert result.exit_code == 0
+    assert 'Dumped 3 rows' in result.output
+    with io.open(str(directory.join('comments.csv')), encoding='utf-8') as file:
+        assert file.read().splitlines() == ['entry_id,comment', '1,good']
+
+    # Dump (ndjson)
+    result = runner.invoke(cli, ['dump', url, str(directory),
+        '--prefix', 'test_cli_', '--bucket', 'comments', '--format', 'ndjson'])
+    assert result.exit_code == 0
+    with io.open(str(directory.join('comments.ndjson')), encoding='utf-8') as file:
+        assert json.loads(file.read()) == {'entry_id': 1, 'comment': 'good'}
+
+
+def test_cli_load_error(tmpdir):
+    url = 'sqlite:///%s' % tmpdir.join('database.db')
+    result = CliRunner().invoke(cli, ['load', url, 'data/not-existent.csv'])
+    assert result.exit_code == 1
@@ -6,6 +6,7 @@ from __future__ import unicode_literals
 
 import pytest
 import tableschema
+import sqlalchemy as sa
 from mock import Mock
 from tableschema_sql.mapper import Mapper
 
@@ -21,3 +22,88 @@ def test_mapper_restore_bucket():
     mapper = Mapper('prefix_')
     assert mapper.restore_bucket('prefix_bucket') == 'bucket'
     assert mapper.restore_bucket('xxxxxx_bucket') is None
+
+
+def test_mapper_native_types():
+    mapper = Mapper('prefix_', dialect='sqlite')
+    schema = tableschema.Schema({'fields': [
+        {'name': 'yearmonth', 'type': 'yearmonth'},
+        {'name': 'geopoint', 'type': 'geopoint'},
+    ]})
+    row = mapper.convert_row({'yearmonth': '2015-01', 'geopoint': '30,75'}, schema, [])
+    assert row == {'yearmonth': 201501, 'geopoint': [30.0, 75.0]}
+    restored = mapper.restore_row([201501, [30.0, 75.0]], schema, None)
+    assert restored == schema.cast_row(['2015-01', '30,75'])
+    assert mapper.restore_type(mapper.convert_type('object')) == 'object'
+
+
+@pytest.mark.parametrize('dialect', ['sqlite', 'mysql'])
+def test_mapper_native_types_json_null(dialect):
+    # Missing compound values are stored as SQL NULL, not as JSON 'null'
+    mapper = Mapper('prefix_', dialect=dialect)
+    types = ['array', 'geojson', 'geopoint', 'object']
+    table = sa.Table('table', sa.MetaData(),
+        *[sa.Column(type, mapper.convert_type(type)) for type in types])
+    engine = sa.create_engine('sqlite://')
+    with engine.begin() as connection:
+        table.create(connection)
+        connection.execute(table.insert(), [dict((type, None) for type in types)])
+        for type in types:
+            query = sa.select(sa.func.count()).where(table.c[type].is_(None))
+            assert connection.execute(query).scalar() == 1
+
+
+@pytest.mark.parametrize('dialect', ['postgresql', 'sqlite', 'mysql'])
+def test_mapper_restore_type(dialect):
+    from sqlalchemy.dialects import mysql, postgresql
+    mapper = Mapper('prefix_', dialect=dialect)
+    types = [
+        (sa.BigInteger(), 'integer'),
+        (mysql.TINYINT(), 'integer'),
+        (sa.Numeric(10, 2), 'number'),
+        (sa.Float(), 'number'),
+        (sa.VARCHAR(10), 'string'),
+        (sa.TIMESTAMP(), 'datetime'),
+        (sa.Boolean(), 'boolean'),
+        (postgresql.JSONB(), 'object'),
+    ]
+    if dialect == 'postgresql':
+        types.extend([(postgresql.UUID(), 'string'), (postgresql.ARRAY(sa.Integer), 'array')])
+    # Lookups are cached per type class
+    for _ in range(2):
+        for type, field_type in types:
+            assert mapper.restore_type(type) == field_type
+        with pytest.raises(tableschema.exceptions.StorageError):
+            mapper.restore_type(sa.LargeBinary())
+
+
+@pytest.mark.parametrize('dialect', ['postgresql', 'sqlite', 'mysql'])
+def test_mapper_marked_types(dialect):
+    from sqlalchemy.dialects import sqlite
+    mapper = Mapper('prefix_', dialect=dialect)
+    descriptor = {'fields': [
+        {'name': 'yearmonth', 'type': 'yearmonth', 'title': 'Month'},
+        {'name': 'geopoint', 'type': 'geopoint'},
+        {'name': 'duration', 'type': 'duration'},
+    ]}
+    columns = mapper.convert_descriptor('bucket', descriptor)[0]
+    field_types = ['yearmonth', 'geopoint', 'duration' if dialect == 'postgresql' else 'string']
+    for column, field_type in zip(columns, field_types):
+        # Reflected columns have a comment marker or a declared type name (SQLite)
+        type = getattr(column.type, 'impl', column.type)
+        if dialect == 'sqlite':
+            name = column.type.compile(dialect=sqlite.dialect())
+            type = mapper.get_declared_types().get(name, type.__class__)()
+        column_info = {'name': column.name, 'type': type, 'comment': column.comment}
+        mapper.restore_column(column_info)
+        assert mapper.restore_type(column_info['type']) == field_type
+    assert columns[0].comment.startswith('Month\n')
+
+
+def test_mapper_duration_parts():
+    import isodate
+    from datetime import timedelta
+    mapper = Mapper('prefix_', dialect='postgresql')
+    type = mapper.convert_type('duration')
+    assert type.process_result_value('1 1 0 0 0 0.000000', None) == isodate.parse_duration('P1Y1M')
+    assert type.process_result_value('0 0 2 3 4 5.5', None) == timedelta(2, 3 * 3600 + 4 * 60 + 5.5)
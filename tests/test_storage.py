@@ -5,12 +5,17 @@ from __future__ import absolute_import
 from __future__ import unicode_literals
 
 import os
+import sys
 import io
 import json
 import pytest
+import subprocess
 import tableschema
 import sqlalchemy as sa
 from copy import deepcopy
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from datetime import date
 from tabulator import Stream
 from sqlalchemy import create_engine, text
 from sqlalchemy.engine import reflection
@@ -159,33 +164,32 @@ def test_storage_flow(dialect, database_url):
             {'name': 'date', 'type': 'date'},
             {'name': 'date_year', 'type': 'date'}, # format removal
             {'name': 'datetime', 'type': 'datetime'},
-            {'name': 'duration', 'type': 'string'}, # type fallback
+            {'name': 'duration', 'type': 'duration' if dialect == 'postgresql' else 'string'},
             {'name': 'time', 'type': 'time'},
             {'name': 'year', 'type': 'integer'}, # type downgrade
-            {'name': 'yearmonth', 'type': 'string'}, # type fallback
+            {'name': 'yearmonth', 'type': 'yearmonth'},
+        ],
+    }
+    assert storage.describe('location') == {
+        'fields': [
+            {'name': 'location', 'type': 'object'}, # type downgrade
+            {'name': 'geopoint', 'type': 'geopoint'},
+        ],
+    }
+    assert storage.describe('compound') == {
+        'fields': [
+            {'name': 'stats', 'type': 'object'},
+            {'name': 'persons', 'type': 'object'}, # type downgrade
         ],
     }
-    if dialect != 'sqlite':
-        assert storage.describe('location') == {
-            'fields': [
-                {'name': 'location', 'type': 'object'}, # type downgrade
-                {'name': 'geopoint', 'type': 'string'}, # type fallback
-            ],
-        }
-        assert storage.describe('compound') == {
-            'fields': [
-                {'name': 'stats', 'type': 'object'},
-                {'name': 'persons', 'type': 'object'}, # type downgrade
-            ],
-        }
 
     # Assert data
     assert storage.read('articles') == cast(ARTICLES)['data']
     assert storage.read('comments') == cast(COMMENTS)['data']
-    assert storage.read('temporal') == cast(TEMPORAL, skip=['duration', 'yearmonth'])['data']
-    if dialect != 'sqlite':
-        assert storage.read('location') == cast(LOCATION, skip=['geopoint'])['data']
-        assert storage.read('compound') == cast(COMPOUND)['data']
+    skip = [] if dialect == 'postgresql' else ['duration']
+    assert storage.read('temporal') == cast(TEMPORAL, skip=skip)['data']
+    assert storage.read('location') == cast(LOCATION)['data']
+    assert storage.read('compound') == cast(COMPOUND)['data']
 
     # Assert data with forced schema
     storage.describe('compound', COMPOUND['schema'])
@@ -268,28 +272,28 @@ def test_storage_limited_databases(dialect, database_url):
             {'name': 'duration', 'type': 'string'}, # type fallback
             {'name': 'time', 'type': 'time'},
             {'name': 'year', 'type': 'integer'}, # type downgrade
-            {'name': 'yearmonth', 'type': 'string'}, # type fallback
+            {'name': 'yearmonth', 'type': 'yearmonth'},
         ],
     }
     assert storage.describe('location') == {
         'fields': [
-            {'name': 'location', 'type': 'string'}, # type fallback
-            {'name': 'geopoint', 'type': 'string'}, # type fallback
+            {'name': 'location', 'type': 'object'}, # type downgrade
+            {'name': 'geopoint', 'type': 'geopoint'},
         ],
     }
     assert storage.describe('compound') == {
         'fields': [
-            {'name': 'stats', 'type': 'string'}, # type fallback
-            {'name': 'persons', 'type': 'string'}, # type fallback
+            {'name': 'stats', 'type': 'object'},
+            {'name': 'persons', 'type': 'object'}, # type downgrade
         ],
     }
 
     # Assert data
     assert storage.read('articles') == cast(ARTICLES)['data']
     assert storage.read('comments') == cast(COMMENTS)['data']
-    assert storage.read('temporal') == cast(TEMPORAL, skip=['duration', 'yearmonth'])['data']
-    assert storage.read('location') == cast(LOCATION, skip=['geojson', 'geopoint'])['data']
-    assert storage.read('compound') == cast(COMPOUND, skip=['array', 'object'])['data']
+    assert storage.read('temporal') == cast(TEMPORAL, skip=['duration'])['data']
+    assert storage.read('location') == cast(LOCATION)['data']
+    assert storage.read('compound') == cast(COMPOUND)['data']
 
     # Assert data with forced schema
     storage.describe('compound', COMPOUND['schema'])
@@ -321,6 +325,112 @@ def test_storage_write_generator():
     assert storage.read('comments') == cast(COMMENTS)['data']
 
 
+@pytest.mark.parametrize('dialect, database_url', [
+    ('postgresql', os.environ['POSTGRES_URL']),
+    ('sqlite', os.environ['SQLITE_URL']),
+])
+def test_storage_write_cast_workers(dialect, database_url):
+
+    # Create storage
+    engine = create_engine(database_url)
+    storage = Storage(engine=engine, prefix='test_storage_cast_workers_')
+    storage.create('temporal', TEMPORAL['schema'], force=True)
+
+    # Write data using a pool of processes
+    storage.write('temporal', TEMPORAL['data'] * 5, cast_workers=2, buffer_size=3)
+
+    # Assert
+    expected = cast(TEMPORAL)['data'] * 5
+    assert storage.read('temporal') == expected
+
+    # Write bad data
+    data = TEMPORAL['data'] * 2 + [['bad-date'] + TEMPORAL['data'][0][1:]]
+    with pytest.raises(tableschema.exceptions.CastError) as excinfo:
+        storage.write('temporal', data, cast_workers=2, buffer_size=3)
+    assert excinfo.value.row_index == 4
+
+
+@pytest.mark.parametrize('dialect, database_url', [
+    ('postgresql', os.environ['POSTGRES_URL']),
+    ('sqlite', os.environ['SQLITE_URL']),
+])
+def test_storage_import_source(dialect, database_url):
+
+    # Create storage
+    engine = create_engine(database_url)
+    storage = Storage(engine=engine, prefix='test_storage_import_source_')
+
+    # Import source
+    count = storage.import_source('articles', 'data/articles.csv',
+        infer_sample=1, force=True, buffer_size=1)
+
+    # Assert
+    descriptor = storage.describe('articles')
+    with Stream('data/articles.csv', headers=1) as stream:
+        headers = stream.headers
+        data = stream.read()
+    assert count == 2
+    assert [field['name'] for field in descriptor['fields']] == headers
+    assert storage.read('articles') == cast({'schema': descriptor, 'data': data})['data']
+
+
+@pytest.mark.parametrize('dialect, database_url', [
+    ('postgresql', os.environ['POSTGRES_URL']),
+    ('sqlite', os.environ['SQLITE_URL']),
+])
+def test_storage_export(dialect, database_url):
+
+    # Create storage
+    engine = create_engine(database_url)
+    storage = Storage(engine=engine, prefix='test_storage_export_')
+    storage.create(['articles', 'temporal'], [remove_fk(ARTICLES['schema']), TEMPORAL['schema']],
+        force=True)
+    storage.write('articles', ARTICLES['data'])
+    storage.write('temporal', TEMPORAL['data'])
+
+    # Export CSV
+    fileobj = io.StringIO()
+    batches = []
+    assert storage.export('articles', fileobj, format='csv', batch_size=1,
+        on_batch=batches.append) == 2
+    assert batches == [1, 1]
+    assert fileobj.getvalue().splitlines() == [
+        'id,parent,name,current,rating',
+        '1,,Taxes,true,9.5',
+        '2,1,中国人,false,7' + ('' if dialect == 'postgresql' else '.0'),
+    ]
+
+    # Export CSV (round trip)
+    fileobj = io.StringIO()
+    storage.export('temporal', fileobj)
+    with Stream(fileobj.getvalue(), scheme='text', format='csv', headers=1) as stream:
+        data = stream.read()
+    assert cast({'schema': TEMPORAL['schema'], 'data': data}) == cast(TEMPORAL)
+
+    # Export NDJSON
+    fileobj = io.StringIO()
+    assert storage.export('articles', fileobj, format='ndjson') == 2
+    rows = [json.loads(line) for line in fileobj.getvalue().splitlines()]
+    assert rows == [
+        {'id': 1, 'parent': None, 'name': 'Taxes', 'current': True, 'rating': 9.5},
+        {'id': 2, 'parent': 1, 'name': '中国人', 'current': False, 'rating': 7},
+    ]
+
+    # Export using COPY
+    if dialect == 'postgresql':
+        fileobj = io.StringIO()
+        assert storage.export('articles', fileobj, copy=True) == 2
+        assert fileobj.getvalue().splitlines() == [
+            'id,parent,name,current,rating',
+            '1,,Taxes,t,9.5',
+            '2,1,中国人,f,7',
+        ]
+
+    # Not supported format
+    with pytest.raises(tableschema.exceptions.StorageError):
+        storage.export('articles', io.StringIO(), format='xlsx')
+
+
 @pytest.mark.parametrize('use_bloom_filter, buffer_size', [
     (True, 1000),
     (False, 1000),
@@ -415,6 +525,923 @@ def test_storage_update(use_bloom_filter, buffer_size):
     assert list(map(lambda i: i.updated_id, gen)) == [None, None, None, None, None]
 
 
+@pytest.mark.parametrize('dialect, database_url', [
+    ('postgresql', os.environ['POSTGRES_URL']),
+    ('sqlite', os.environ['SQLITE_URL']),
+])
+def test_storage_bucket_writer(dialect, database_url):
+
+    # Create storage
+    engine = create_engine(database_url)
+    storage = Storage(engine=engine, prefix='test_storage_bucket_writer_')
+    storage.create('comments', remove_fk(COMMENTS['schema']), force=True)
+
+    # Write rows over time
+    writer = storage.writer('comments', update_keys=['entry_id'], flush_size=3)
+    assert writer.write([['1', 'good', 'note1']]) == 0
+    assert writer.write([['2', 'bad', 'note2']]) == 0
+    assert writer.pending == 2
+    assert storage.read('comments') == []
+    assert writer.write([['1', 'better', 'note1']]) == 3
+    assert writer.pending == 0
+    assert storage.read('comments') == [[1, 'better', 'note1'], [2, 'bad', 'note2']]
+
+    # Explicit flush
+    writer.write([['3', 'ugly', 'note3']])
+    assert writer.flush() == 1
+    assert writer.flush() == 0
+    assert len(storage.read('comments')) == 3
+
+    # Flush interval and context manager
+    with storage.writer('comments', keyed=True, update_keys=['entry_id'],
+            flush_interval=0) as writer:
+        assert writer.write([{'entry_id': '2', 'comment': 'good', 'note': 'note2'}]) == 1
+    assert storage.read('comments') == [
+        [1, 'better', 'note1'], [2, 'good', 'note2'], [3, 'ugly', 'note3']]
+
+    # Retry after a failed flush doesn't write buffered rows twice
+    failures = [sa.exc.OperationalError('UPDATE', {}, Exception('database is locked'))]
+    def fail(connection, cursor, statement, *args):
+        if failures and statement.startswith('UPDATE'):
+            raise failures.pop()
+    sa.event.listen(engine, 'before_cursor_execute', fail)
+    writer = storage.writer('comments', update_keys=['entry_id'], coalesce=True, flush_size=2)
+    with pytest.raises(sa.exc.OperationalError):
+        writer.write([['3', 'fine', 'note3'], ['4', 'new', 'note4']])
+    assert writer.pending == 2
+    assert writer.flush() == 2
+    sa.event.remove(engine, 'before_cursor_execute', fail)
+    assert storage.read('comments') == [
+        [1, 'better', 'note1'], [2, 'good', 'note2'], [3, 'fine', 'note3'], [4, 'new', 'note4']]
+
+
+def test_storage_bucket_writer_threads(tmpdir):
+    engine = create_engine('sqlite:///%s' % tmpdir.join('database.db'))
+    storage = Storage(engine=engine, prefix='test_storage_bucket_writer_threads_')
+    storage.create('numbers', {'fields': [{'name': 'number', 'type': 'integer'}]})
+
+    # Rows written by threads are flushed once each
+    writer = storage.writer('numbers', flush_size=50)
+    def write(thread):
+        for number in range(thread * 2000, (thread + 1) * 2000):
+            writer.write([[number]])
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        list(executor.map(write, range(4)))
+    writer.close()
+    numbers = [row[0] for row in storage.read('numbers')]
+    assert sorted(numbers) == list(range(8000))
+
+
+@pytest.mark.parametrize('autoincrement', [None, '__id'])
+def test_storage_key_snapshots(tmpdir, autoincrement):
+    RESOURCE = {
+        'schema': {
+            'fields': [
+                {'name': 'person_id', 'type': 'integer'},
+                {'name': 'name', 'type': 'string'},
+            ],
+        },
+        'data': [['1', 'ulysses'], ['2', 'theseus']],
+    }
+
+    # Create storage
+    directory = str(tmpdir.join('snapshots'))
+    engine = create_engine('sqlite:///%s' % tmpdir.join('database.db'))
+    options = {'prefix': 'test_snapshots_', 'autoincrement': autoincrement,
+        'key_snapshots': directory}
+    storage = Storage(engine=engine, **options)
+    storage.create('persons', RESOURCE['schema'])
+
+    # Write data creating a snapshot
+    storage.write('persons', RESOURCE['data'], update_keys=['person_id'])
+    assert len(os.listdir(directory)) == 1
+
+    # Write data using the snapshot
+    storage = Storage(engine=engine, **options)
+    storage.write('persons', [['2', 'perseus'], ['3', 'dedalus']], update_keys=['person_id'])
+
+    # Foreign writer
+    with engine.begin() as connection:
+        connection.execute(text(
+            "INSERT INTO test_snapshots_persons (person_id, name) VALUES (4, 'zeus')"))
+
+    # Write data using the snapshot
+    storage = Storage(engine=engine, **options)
+    storage.write('persons', [['4', 'apollo'], ['1', 'ares']], update_keys=['person_id'])
+    rows = storage.read('persons')
+    if autoincrement:
+        rows = [row[1:] for row in rows]
+    assert sorted(rows) == [[1, 'ares'], [2, 'perseus'], [3, 'dedalus'], [4, 'apollo']]
+
+    # Foreign writer keeping the row count
+    with engine.begin() as connection:
+        connection.execute(text("DELETE FROM test_snapshots_persons WHERE person_id = 3"))
+        connection.execute(text(
+            "INSERT INTO test_snapshots_persons (person_id, name) VALUES (5, 'hermes')"))
+
+    # Keys missing in the snapshot are checked in the database
+    storage = Storage(engine=engine, **options)
+    storage.write('persons', [['5', 'hector']], update_keys=['person_id'])
+    rows = storage.read('persons')
+    if autoincrement:
+        rows = [row[1:] for row in rows]
+    assert sorted(rows) == [[1, 'ares'], [2, 'perseus'], [4, 'apollo'], [5, 'hector']]
+
+    # Delete bucket removing snapshots
+    storage.delete('persons')
+    assert os.listdir(directory) == []
+
+
+@pytest.mark.parametrize('dialect, database_url', [
+    ('postgresql', os.environ['POSTGRES_URL']),
+    ('sqlite', os.environ['SQLITE_URL']),
+])
+def test_storage_staging_strategy(dialect, database_url):
+    RESOURCE = {
+        'schema': {
+            'fields': [
+                {'name': 'person_id', 'type': 'integer'},
+                {'name': 'name', 'type': 'string'},
+                {'name': 'favorite_color', 'type': 'string'},
+            ],
+        },
+        'data': [
+            ['1', 'ulysses', 'blue'],
+            ['2', 'theseus', 'green'],
+        ],
+        'updateData': [
+            ['2', 'theseus', 'red'],
+            ['3', 'perseus', 'grey'],
+        ],
+    }
+
+    # Enum columns are copied to the staging table as they are
+    if dialect == 'postgresql':
+        RESOURCE['schema']['fields'][2]['constraints'] = {'enum': ['blue', 'green', 'red', 'grey']}
+
+    # Create storage
+    engine = create_engine(database_url)
+    storage = Storage(engine=engine, prefix='test_storage_staging_')
+    storage.create('colors', RESOURCE['schema'], force=True)
+
+    # Write data
+    counts = storage.write('colors', RESOURCE['data'],
+        update_keys=['person_id', 'name'], update_strategy='staging')
+    assert counts == (2, 0, 0)
+    counts = storage.write('colors', RESOURCE['updateData'],
+        update_keys=['person_id', 'name'], update_strategy='staging', buffer_size=1)
+    assert counts.inserted == 1
+    assert counts.updated == 1
+
+    # Duplicate and null keys
+    counts = storage.write('colors', [['4', None, 'blue'], ['1', 'ulysses', 'green']],
+        update_keys=['person_id', 'name'], update_strategy='staging')
+    assert counts == (1, 1, 0)
+    counts = storage.write('colors', [['4', None, 'red'], ['4', None, 'grey']],
+        update_keys=['person_id', 'name'], update_strategy='staging')
+    assert counts == (0, 1, 1)
+
+    # Assert data
+    assert sorted(storage.read('colors'), key=str) == [
+        [1, 'ulysses', 'green'],
+        [2, 'theseus', 'red'],
+        [3, 'perseus', 'grey'],
+        [4, None, 'grey'],
+    ]
+
+    # Wrong arguments
+    with pytest.raises(tableschema.exceptions.StorageError):
+        storage.write('colors', RESOURCE['data'], update_strategy='staging')
+    with pytest.raises(tableschema.exceptions.StorageError):
+        storage.write('colors', RESOURCE['data'], update_strategy='bad')
+
+
+def test_storage_partitioning():
+    engine = create_engine(os.environ['POSTGRES_URL'])
+    storage = Storage(engine=engine, prefix='test_partitioning_')
+    storage.delete()
+    descriptor = {
+        'fields': [
+            {'name': 'created', 'type': 'date'},
+            {'name': 'kind', 'type': 'string'},
+        ],
+    }
+    storage.create(
+        ['events', 'kinds', 'hashed'], [descriptor] * 3,
+        partition_by=[
+            {'field': 'created', 'strategy': 'range', 'interval': 'month'},
+            {'field': 'kind', 'strategy': 'list'},
+            {'field': 'kind', 'strategy': 'hash', 'partitions': 4},
+        ])
+    data = [
+        ['2015-01-01', 'click'],
+        ['2015-01-31', 'view'],
+        ['2015-02-15', 'click'],
+        ['2015-03-01', 'view'],
+        [None, None],
+    ]
+    for bucket in ['events', 'kinds', 'hashed']:
+        storage.write(bucket, data)
+
+    # Partitions are not buckets
+    storage = Storage(engine=engine, prefix='test_partitioning_')
+    assert storage.buckets == ['events', 'hashed', 'kinds']
+
+    # Missing partitions are created on write using the reflected specification
+    storage.write('events', [['2015-04-01', 'click']])
+    assert len(storage.read('events')) == 6
+
+    # Statistics are summed over partitions
+    with engine.begin() as connection:
+        connection.exec_driver_sql('ANALYZE test_partitioning_events')
+    assert storage.count('events', exact=False) == 6
+    assert storage.stats('events')['bytes'] > 0
+
+    # Retention
+    assert sorted(storage.delete_partitions('events', before=date(2015, 3, 1))) == \
+        ['test_partitioning_events_p201501', 'test_partitioning_events_p201502']
+    assert set(row[0] for row in storage.read('events')) == \
+        set([date(2015, 3, 1), date(2015, 4, 1), None])
+    assert storage.delete_partitions('kinds', values=['view']) == ['test_partitioning_kinds_pview']
+    assert len(storage.read('kinds')) == 3
+
+    # List values don't collide with the default partition and long names are shortened
+    long_value = 'x' * 100
+    storage.write('kinds', [['2015-01-01', 'default'], ['2015-01-01', long_value]])
+    names = storage.delete_partitions('kinds', values=['default', long_value])
+    assert names[0] == 'test_partitioning_kinds_pdefault'
+    assert len(names[1]) == 63
+    storage.write('kinds', [[None, None]])
+    assert len(storage.read('kinds')) == 4
+    assert Storage(engine=engine, prefix='test_partitioning_').delete_partitions(
+        'kinds', values=['click']) == ['test_partitioning_kinds_pclick']
+    assert len(storage.read('hashed')) == 5
+    with pytest.raises(tableschema.exceptions.StorageError):
+        storage.delete_partitions('hashed', before=date(2015, 3, 1))
+
+    # Wrong specifications
+    with pytest.raises(tableschema.exceptions.StorageError):
+        storage.create('bad', descriptor, partition_by={'field': 'created', 'interval': 'hour'})
+    with pytest.raises(tableschema.exceptions.StorageError):
+        storage.create('bad', descriptor, partition_by={'field': 'missing'})
+
+    storage.delete()
+
+
+@pytest.mark.parametrize('dialect', ['postgresql', 'sqlite'])
+def test_storage_session(tmpdir, dialect):
+    database_url = os.environ['POSTGRES_URL']
+    if dialect == 'sqlite':
+        database_url = 'sqlite:///%s' % tmpdir.join('database.db')
+
+    # Create storage
+    engine = create_engine(database_url)
+    directory = str(tmpdir.join('snapshots'))
+    storage = Storage(engine=engine, prefix='test_storage_session_', key_snapshots=directory)
+    storage.delete()
+    storage.create(['articles', 'comments'],
+        [remove_fk(ARTICLES['schema']), remove_fk(COMMENTS['schema'])])
+
+    # Write buckets in one transaction
+    with storage.session() as session:
+        session.write('articles', ARTICLES['data'])
+        session.write('comments', COMMENTS['data'], update_keys=['entry_id'])
+        assert session.read('articles') == cast(ARTICLES)['data']
+        with pytest.raises(tableschema.exceptions.StorageError):
+            with session.session():
+                pass
+    assert storage.read('comments') == cast(COMMENTS)['data']
+    assert len(os.listdir(directory)) == 1
+
+    # Rollback all buckets on error (key snapshots are kept)
+    with pytest.raises(RuntimeError):
+        with storage.session() as session:
+            session.delete('comments')
+            session.write('articles', [['3', '', 'Tax', 'True', '1']])
+            raise RuntimeError('error')
+    assert storage.buckets == ['articles', 'comments']
+    assert storage.read('articles') == cast(ARTICLES)['data']
+    assert len(os.listdir(directory)) == 1
+
+    # Other threads don't use the session connection
+    with storage.session() as session:
+        session.write('articles', [['3', '', 'Tax', 'True', '1']])
+        executor = ThreadPoolExecutor(max_workers=1)
+        assert executor.submit(storage.count, 'articles').result() == 2
+        executor.shutdown()
+    assert storage.count('articles') == 3
+
+    # Writers are flushed with the session and can't be used after it
+    with storage.session() as session:
+        writer = session.writer('articles')
+        writer.write([['4', '', 'Tax', 'True', '1']])
+    assert storage.count('articles') == 4
+    with pytest.raises(tableschema.exceptions.StorageError):
+        writer.write([['5', '', 'Tax', 'True', '1']])
+
+    # Clean up
+    storage.delete()
+
+
+@pytest.mark.parametrize('dialect, database_url', [
+    ('postgresql', os.environ['POSTGRES_URL']),
+    ('sqlite', os.environ['SQLITE_URL']),
+])
+def test_storage_count_stats(dialect, database_url):
+    engine = create_engine(database_url)
+    storage = Storage(engine=engine, prefix='test_stats_')
+    storage.delete()
+    storage.create('articles', remove_fk(ARTICLES['schema']), indexes_fields=[['name']])
+    storage.create('compound', COMPOUND['schema'])
+    storage.write('articles', ARTICLES['data'] + [['3', '', None, 'True', '1']])
+    storage.write('compound', COMPOUND['data'] + [[None, None]])
+
+    # Count
+    assert storage.count('articles') == 3
+    assert storage.count('articles', exact=False) == 3
+    with engine.begin() as connection:
+        connection.exec_driver_sql('ANALYZE')
+    assert storage.count('articles', exact=False) == 3
+
+    # Stats
+    stats = storage.stats('articles')
+    assert stats['count'] == 3
+    assert stats['fields']['id'] == {'min': 1, 'max': 3, 'nulls': 0}
+    assert stats['fields']['parent'] == {'min': 1, 'max': 1, 'nulls': 2}
+    assert stats['fields']['name'] == {'min': 'Taxes', 'max': '中国人', 'nulls': 1}
+    assert stats['fields']['current'] == {'min': None, 'max': None, 'nulls': 0}
+    assert storage.stats('compound')['fields']['stats']['nulls'] == 1
+    if dialect == 'postgresql':
+        assert stats['bytes'] > 0
+        assert set(stats['indexes']) == set(['test_stats_articles_pkey', 'test_stats_articles_ix000'])
+
+    storage.delete()
+
+
+@pytest.mark.parametrize('dialect, database_url', [
+    ('postgresql', os.environ['POSTGRES_URL']),
+    ('sqlite', os.environ['SQLITE_URL']),
+])
+def test_storage_get_many(dialect, database_url):
+    engine = create_engine(database_url)
+    storage = Storage(engine=engine, prefix='test_get_', autoincrement={'comments': '_id'})
+    storage.delete()
+    storage.create('articles', remove_fk(ARTICLES['schema']))
+    storage.write('articles', ARTICLES['data'] + [['3', '', 'Tax', 'True', '1']])
+    articles = cast(ARTICLES)['data']
+
+    # Primary key
+    assert storage.get('articles', '2') == articles[1]
+    assert storage.get('articles', 10) is None
+    rows = storage.get_many('articles', [2, 10, 1, 2], chunk_size=2)
+    assert rows == [articles[1], None, articles[0], articles[1]]
+
+    # Other key fields
+    rows = storage.get_many('articles', [['Taxes', 1], ['Taxes', 2]], key_fields=['name', 'id'])
+    assert rows == [articles[0], None]
+
+    # Autoincrement column
+    storage.create('comments', {'fields': COMMENTS['schema']['fields']})
+    storage.write('comments', COMMENTS['data'])
+    assert storage.get('comments', 'good', key_fields='comment') == [1] + cast(COMMENTS)['data'][0]
+
+    # Wrong keys
+    with pytest.raises(tableschema.exceptions.StorageError):
+        storage.get('articles', [1, 2])
+    with pytest.raises(tableschema.exceptions.StorageError):
+        storage.get('comments', 1)
+
+    storage.delete()
+
+
+@pytest.mark.parametrize('dialect, database_url', [
+    ('postgresql', os.environ['POSTGRES_URL']),
+    ('sqlite', os.environ['SQLITE_URL']),
+])
+def test_storage_write_coalesce(dialect, database_url):
+    engine = create_engine(database_url)
+    storage = Storage(engine=engine, prefix='test_coalesce_')
+    schema = {
+        'fields': [
+            {'name': 'id', 'type': 'integer'},
+            {'name': 'name', 'type': 'string'},
+        ],
+    }
+    storage.create('persons', schema, force=True)
+    storage.write('persons', [['1', 'a'], ['2', 'b']])
+    data = [['3', 'c'], ['3', 'cc'], ['1', 'x'], ['1', 'xx'], ['4', 'd'], ['3', 'ccc']]
+
+    # Last row wins in one batch
+    gen = storage.write('persons', data, update_keys=['id'], coalesce=True,
+        as_generator=True, results='batches', buffer_size=10)
+    assert [(batch.inserted, batch.updated) for batch in gen] == [(2, 1)]
+    assert sorted(storage.read('persons')) == [[1, 'xx'], [2, 'b'], [3, 'ccc'], [4, 'd']]
+
+    # Merge function
+    merge = lambda old, new: dict(new, name=old['name'] + new['name'])
+    counts = storage.write('persons', data, update_keys=['id'], coalesce=merge, results='counts')
+    assert counts == (0, 3, 3)
+    assert sorted(storage.read('persons')) == [[1, 'xxx'], [2, 'b'], [3, 'cccccc'], [4, 'd']]
+
+    # Long-lived writer
+    with storage.writer('persons', update_keys=['id'], coalesce=True) as writer:
+        writer.write([['5', 'e'], ['5', 'ee']])
+    assert storage.get_many('persons', [5], key_fields=['id']) == [[5, 'ee']]
+
+    # Coalesce requires update keys
+    with pytest.raises(tableschema.exceptions.StorageError):
+        storage.write('persons', data, coalesce=True)
+
+    storage.delete()
+
+
+@pytest.mark.parametrize('dialect, database_url', [
+    ('postgresql', os.environ['POSTGRES_URL']),
+    ('sqlite', os.environ['SQLITE_URL']),
+])
+def test_storage_durability(dialect, database_url):
+    engine = create_engine(database_url)
+    storage = Storage(engine=engine, prefix='test_durability_')
+    storage.delete()
+    with storage.session() as session:
+        durability = 'unlogged' if dialect == 'postgresql' else 'temporary'
+        session.create('articles', remove_fk(ARTICLES['schema']), durability=durability)
+        session.create(['stage', 'comments'],
+            [remove_fk(ARTICLES['schema']), remove_fk(COMMENTS['schema'])],
+            durability='temporary')
+        session.write('articles', ARTICLES['data'])
+        session.write('stage', ARTICLES['data'])
+        session.write('comments', COMMENTS['data'])
+
+        # Temporary buckets are kept after reflection
+        session.delete('comments')
+        assert session.buckets == ['articles', 'stage']
+        assert session.read('stage') == cast(ARTICLES)['data']
+        assert session.read('articles') == cast(ARTICLES)['data']
+
+        # Not supported durability
+        with pytest.raises(tableschema.exceptions.StorageError):
+            session.create('bad', ARTICLES['schema'], durability='bad')
+        if dialect == 'sqlite':
+            with pytest.raises(tableschema.exceptions.StorageError):
+                session.create('bad', ARTICLES['schema'], durability='unlogged')
+
+        session.delete()
+
+
+def test_storage_durability_session_exit(tmpdir):
+    schema = {'fields': [{'name': 'id', 'type': 'integer'}]}
+
+    # Temporary buckets of a pooled connection are forgotten on exit
+    engine = create_engine('sqlite:///%s' % tmpdir.join('database.db'))
+    storage = Storage(engine=engine, prefix='test_durability_session_exit_')
+    storage.create('persistent', schema)
+    with storage.session() as session:
+        session.create('stage', schema, durability='temporary')
+        session.write('stage', [[1], [2]])
+        assert session.buckets == ['persistent', 'stage']
+    assert storage.buckets == ['persistent']
+
+    # A single connection pool keeps them
+    storage = Storage(engine=create_engine('sqlite://'), prefix='test_durability_session_exit_')
+    with storage.session() as session:
+        session.create('stage', schema, durability='temporary')
+        session.write('stage', [[1], [2]])
+    assert storage.buckets == ['stage']
+    assert storage.read('stage') == [[1], [2]]
+
+
+@pytest.mark.parametrize('dialect, database_url', [
+    ('postgresql', os.environ['POSTGRES_URL']),
+    ('sqlite', os.environ['SQLITE_URL']),
+])
+def test_storage_write_resume(dialect, database_url):
+    engine = create_engine(database_url)
+    storage = Storage(engine=engine, prefix='test_resume_')
+    schema = {'fields': [{'name': 'id', 'type': 'integer'}]}
+    storage.create('numbers', schema, force=True)
+    def source(fail_at=None):
+        for number in range(10):
+            if number == fail_at:
+                raise RuntimeError('Failed')
+            yield [number]
+
+    # Committed batches are kept on failure
+    with pytest.raises(RuntimeError):
+        storage.write('numbers', source(fail_at=7),
+            buffer_size=2, commit_every=1, resume_token='job')
+    assert storage.count('numbers') == 6
+
+    # Restarted write skips committed rows
+    counts = storage.write('numbers', source(), buffer_size=2, commit_every=1,
+        resume_token='job', results='counts')
+    assert counts == (4, 0, 0)
+    assert sorted(storage.read('numbers')) == [[number] for number in range(10)]
+
+    # Completed write is not repeated
+    storage.write('numbers', source(), resume_token='job')
+    assert storage.count('numbers') == 10
+
+    # Progress table is not a bucket
+    assert Storage(engine=engine, prefix='').buckets.count('tableschema_sql_progress') == 0
+
+    # Wrong arguments
+    with pytest.raises(tableschema.exceptions.StorageError):
+        storage.write('numbers', source(), commit_every=0)
+    with storage.session() as session:
+        with pytest.raises(tableschema.exceptions.StorageError):
+            session.write('numbers', source(), commit_every=1)
+
+    storage.delete()
+
+
+@pytest.mark.parametrize('dialect, database_url', [
+    ('postgresql', os.environ['POSTGRES_URL']),
+    ('sqlite', os.environ['SQLITE_URL']),
+])
+def test_storage_write_parallel(dialect, database_url):
+    engine = create_engine(database_url)
+    storage = Storage(engine=engine, prefix='test_parallel_')
+    schema = {
+        'fields': [
+            {'name': 'id', 'type': 'integer'},
+            {'name': 'name', 'type': 'string'},
+        ],
+    }
+    storage.create('persons', schema, force=True)
+
+    # Batches round robin
+    rows = [[str(number), 'a'] for number in range(100)]
+    counts = storage.write('persons', rows, parallel=3, buffer_size=7, results='counts')
+    assert counts == (100, 0, 0)
+    assert storage.count('persons') == 100
+
+    # Sharded by update keys (existing keys are scanned once for all writers)
+    scans = []
+    def count_scans(connection, cursor, statement, *args):
+        if statement.startswith('SELECT') and 'test_parallel_persons' in statement:
+            scans.append(statement)
+    sa.event.listen(engine, 'before_cursor_execute', count_scans)
+    rows = [[str(number), 'b'] for number in range(50, 150)]
+    counts = storage.write('persons', rows, update_keys=['id'], parallel=3,
+        buffer_size=7, results='counts')
+    sa.event.remove(engine, 'before_cursor_execute', count_scans)
+    assert counts == (50, 50, 0)
+    assert len(scans) == 1
+    assert sorted(storage.read('persons'))[49:51] == [[49, 'a'], [50, 'b']]
+
+    # Wrong arguments
+    with pytest.raises(tableschema.exceptions.StorageError):
+        storage.write('persons', rows, parallel=0)
+    with pytest.raises(tableschema.exceptions.StorageError):
+        storage.write('persons', rows, parallel=2, parallel_commit='bad')
+    with pytest.raises(tableschema.exceptions.StorageError):
+        storage.write('persons', rows, parallel=2, as_generator=True)
+
+    storage.delete()
+
+
+@pytest.mark.parametrize('dialect, database_url', [
+    ('postgresql', os.environ['POSTGRES_URL']),
+    ('sqlite', os.environ['SQLITE_URL']),
+])
+def test_storage_reflect_catalog(dialect, database_url):
+    engine = create_engine(database_url)
+    storage = Storage(engine=engine, prefix='test_catalog_')
+    storage.create(['articles', 'comments', 'temporal'],
+        [ARTICLES['schema'], COMMENTS['schema'], TEMPORAL['schema']],
+        indexes_fields=[[['name']], [], []], force=True)
+    storage.write('articles', ARTICLES['data'])
+
+    # Same descriptors as with the metadata reflection with fewer catalog queries
+    # (see examples/reflect_catalog.py for timings)
+    statements = []
+    def count_statements(connection, cursor, statement, *args):
+        statements.append(statement)
+    sa.event.listen(engine, 'before_cursor_execute', count_statements)
+    reflected = Storage(engine=engine, prefix='test_catalog_')
+    reflected_count = len(statements)
+    fast = Storage(engine=engine, prefix='test_catalog_', reflect_catalog=True)
+    sa.event.remove(engine, 'before_cursor_execute', count_statements)
+    assert len(statements) - reflected_count < reflected_count
+    assert fast.buckets == reflected.buckets
+    for bucket in fast.buckets:
+        assert fast.describe(bucket) == reflected.describe(bucket)
+    assert fast.indexes('articles') == reflected.indexes('articles')
+    assert fast.read('articles') == cast(ARTICLES)['data']
+
+    # Only matching tables and the tables they refer to are reflected
+    fast = Storage(engine=engine, prefix='test_catalog_', reflect_catalog=True,
+        reflect_only=lambda name: name == 'test_catalog_comments')
+    assert fast.buckets == ['articles', 'comments']
+
+    storage.delete()
+
+
+@pytest.mark.parametrize('dialect, database_url', [
+    ('postgresql', os.environ['POSTGRES_URL']),
+    ('sqlite', os.environ['SQLITE_URL']),
+])
+def test_storage_write_typed(dialect, database_url):
+    engine = create_engine(database_url)
+    storage = Storage(engine=engine, prefix='test_typed_')
+    storage.create(['articles', 'temporal'],
+        [remove_fk(ARTICLES['schema']), TEMPORAL['schema']], force=True)
+
+    # Typed values are written as they are
+    articles = cast(ARTICLES)['data']
+    storage.write('articles', articles, input='typed')
+    assert storage.read('articles') == articles
+    temporal = cast(TEMPORAL)['data']
+    storage.write('temporal', temporal, input='typed')
+    assert storage.read('temporal') == temporal
+
+    # Values of other types are rejected unless trusted
+    row = [3, None, 'Tax', 'yes', Decimal('1.5')]
+    with pytest.raises(tableschema.exceptions.CastError):
+        storage.write('articles', [row], input='typed')
+    with pytest.raises(tableschema.exceptions.CastError):
+        storage.write('articles', [[True, None, 'Tax', True, 1]], input='typed')
+    storage.write('articles', [[3, None, 'Tax', True, 1.5]], input='typed', trust=True)
+    assert storage.count('articles') == 3
+
+    # Year/month pairs are accepted as plain tuples
+    row = temporal[0][:-1] + [(2015, 2)]
+    storage.write('temporal', [row], input='typed')
+    assert storage.read('temporal')[-1][-1] == (2015, 2)
+    with pytest.raises(tableschema.exceptions.CastError):
+        storage.write('temporal', [temporal[0][:-1] + [(2015, 2, 1)]], input='typed')
+
+    # Wrong arguments
+    with pytest.raises(tableschema.exceptions.StorageError):
+        storage.write('articles', articles, trust=True)
+    with pytest.raises(tableschema.exceptions.StorageError):
+        storage.write('articles', articles, input='bad')
+
+    storage.delete()
+
+
+@pytest.mark.parametrize('dialect, database_url', [
+    ('postgresql', os.environ['POSTGRES_URL']),
+    ('sqlite', os.environ['SQLITE_URL']),
+])
+def test_storage_copy_to(tmpdir, dialect, database_url):
+    engine = create_engine(database_url)
+    storage = Storage(engine=engine, prefix='test_copy_')
+    storage.create(['articles', 'comments', 'temporal'],
+        [ARTICLES['schema'], COMMENTS['schema'], TEMPORAL['schema']], force=True)
+    storage.write('articles', ARTICLES['data'])
+    storage.write('comments', COMMENTS['data'])
+    storage.write('temporal', TEMPORAL['data'])
+
+    # Same dialect
+    target = Storage(engine=engine, prefix='test_copied_')
+    copied = storage.copy_to(target, workers=2, batch_size=1, force=True)
+    assert list(copied) == ['articles', 'temporal', 'comments']
+    assert copied['articles'].rows == 2
+    assert copied['comments'].rows == 2
+    for bucket in copied:
+        assert target.describe(bucket) == storage.describe(bucket)
+        assert target.read(bucket) == storage.read(bucket)
+
+    # Other dialect
+    other = Storage(engine=create_engine('sqlite:///%s' % tmpdir.join('database.db')))
+    copied = storage.copy_to(other, buckets=['comments', 'articles'])
+    assert list(copied) == ['articles', 'comments']
+    assert other.read('articles') == storage.read('articles')
+    assert other.read('comments') == storage.read('comments')
+
+    # Existing buckets
+    with pytest.raises(tableschema.exceptions.StorageError):
+        storage.copy_to(other, buckets=['articles'])
+
+    # Autoincrement columns are not copied
+    source = Storage(engine=engine, prefix='test_copy_autoincrement_', autoincrement='__id')
+    source.create('cities', {'fields': [
+        {'name': 'name', 'type': 'string'},
+        {'name': 'founded', 'type': 'date'},
+    ]}, force=True)
+    source.write('cities', [['rome', '2015-01-01'], ['paris', None]])
+    for copy_target in [target, other]:
+        source.copy_to(copy_target, force=True)
+        assert copy_target.read('cities') == [row[1:] for row in source.read('cities')]
+    source.delete()
+
+    target.delete()
+    storage.delete()
+
+
+@pytest.mark.parametrize('dialect, database_url', [
+    ('postgresql', os.environ['POSTGRES_URL']),
+    ('sqlite', os.environ['SQLITE_URL']),
+])
+def test_storage_write_replace(dialect, database_url):
+    engine = create_engine(database_url)
+    storage = Storage(engine=engine, prefix='test_replace_')
+    storage.create(['articles', 'comments'], [ARTICLES['schema'], COMMENTS['schema']],
+        indexes_fields=[[{'fields': ['name'], 'name': 'test_replace_name'}], []], force=True)
+    storage.write('articles', ARTICLES['data'])
+    storage.write('comments', COMMENTS['data'])
+    indexes = storage.indexes('articles')
+
+    # Referenced bucket
+    with pytest.raises(tableschema.exceptions.StorageError):
+        storage.write('articles', ARTICLES['data'], mode='replace')
+    storage.delete('comments')
+
+    # Replace rows
+    rows = [['3', '', 'Tax', 'True', '1.5'], ['4', '3', 'Rates', 'False', '2']]
+    storage.write('articles', rows, mode='replace')
+    assert storage.read('articles') == cast({'schema': ARTICLES['schema'], 'data': rows})['data']
+    assert storage.buckets == ['articles']
+    assert storage.describe('articles') == ARTICLES['schema']
+    if dialect == 'postgresql':
+        assert storage.indexes('articles') == indexes
+    else:
+        assert [index['fields'] for index in storage.indexes('articles')] == [['name']]
+    assert Storage(engine=engine, prefix='test_replace_').buckets == ['articles']
+
+    # Failed load keeps the table
+    def failing():
+        yield ['5', '', 'Tax', 'True', '1.5']
+        raise RuntimeError('failed')
+    with pytest.raises(RuntimeError):
+        storage.write('articles', failing(), mode='replace', buffer_size=1)
+    assert storage.count('articles') == 2
+    assert Storage(engine=engine, prefix='test_replace_').buckets == ['articles']
+
+    # Shadow table is created on the first iteration
+    gen = storage.write('articles', rows, mode='replace', as_generator=True)
+    assert Storage(engine=engine, prefix='test_replace_').buckets == ['articles']
+    gen.close()
+
+    # Wrong arguments
+    with pytest.raises(tableschema.exceptions.StorageError):
+        storage.write('articles', rows, mode='replace', update_keys=['id'])
+    with pytest.raises(tableschema.exceptions.StorageError):
+        storage.write('articles', rows, mode='bad')
+
+    storage.delete()
+
+
+@pytest.mark.parametrize('dialect, database_url', [
+    ('postgresql', os.environ['POSTGRES_URL']),
+    ('sqlite', os.environ['SQLITE_URL']),
+])
+def test_storage_write_sorted(dialect, database_url):
+    engine = create_engine(database_url)
+    storage = Storage(engine=engine, prefix='test_sorted_')
+    storage.create('articles', remove_fk(ARTICLES['schema']), force=True)
+
+    # Sorted in memory and with spilled runs
+    rows = [[str(id), '', 'Tax', 'True', str(id % 7)] for id in range(200, 0, -1)]
+    for sort_memory in ['512MB', 1000, 1]:
+        written = storage.write('articles', rows, as_generator=True,
+            sort_by='primaryKey', sort_memory=sort_memory)
+        assert [wr.row['id'] for wr in written] == list(range(1, 201))
+        storage.delete('articles')
+        storage.create('articles', remove_fk(ARTICLES['schema']))
+
+    # Sorting is stable and nulls are last
+    rows = [['3', '', 'Tax', 'True', '1'], ['1', '', 'Tax', 'True', ''],
+        ['2', '', 'Tax', 'True', '1']]
+    written = storage.write('articles', rows, as_generator=True,
+        sort_by=['rating'], sort_memory=1)
+    assert [wr.row['id'] for wr in written] == [3, 2, 1]
+    assert storage.count('articles') == 3
+
+    # Wrong arguments
+    with pytest.raises(tableschema.exceptions.StorageError):
+        storage.write('articles', rows, sort_by='bad')
+    with pytest.raises(tableschema.exceptions.StorageError):
+        storage.write('articles', rows, sort_by='id', sort_memory='lots')
+    storage.create('objects', {'fields': [{'name': 'object', 'type': 'object'}]})
+    with pytest.raises(tableschema.exceptions.StorageError):
+        storage.write('objects', [[{'a': 1}], [{'b': 2}]], sort_by='object')
+
+    storage.delete()
+
+
+def test_storage_read_cache(tmpdir):
+    engine = create_engine('sqlite:///%s' % tmpdir.join('database.db'))
+    storage = Storage(engine=engine, prefix='test_cache_', cache_size=10 ** 6)
+    storage.create('articles', remove_fk(ARTICLES['schema']))
+    storage.write('articles', ARTICLES['data'])
+    articles = cast(ARTICLES)['data']
+
+    # Cached rows and projections
+    assert storage.read('articles') == articles
+    assert storage.read('articles', fields=['name', 'id']) == [['Taxes', 1], ['中国人', 2]]
+    storage.read('articles')[0][2] = 'Changed'
+    assert storage.read('articles') == articles
+
+    # Writes from another storage aren't detected without a check
+    Storage(engine=engine, prefix='test_cache_').write('articles', [['3', '', 'Tax', 'True', '1']])
+    assert len(storage.read('articles')) == 2
+
+    # Own writes invalidate the cache
+    storage.write('articles', [['4', '', 'Tax', 'True', '1']])
+    assert len(storage.read('articles')) == 4
+    with storage.writer('articles') as writer:
+        writer.write([['5', '', 'Tax', 'True', '1']])
+    assert len(storage.read('articles')) == 5
+
+    # Staleness check
+    storage = Storage(engine=engine, prefix='test_cache_', cache_size=10 ** 6, cache_check='count')
+    assert len(storage.read('articles')) == 5
+    Storage(engine=engine, prefix='test_cache_').write('articles', [['6', '', 'Tax', 'True', '1']])
+    assert len(storage.read('articles')) == 6
+
+    # Budget smaller than the rows
+    storage = Storage(engine=engine, prefix='test_cache_', cache_size=10)
+    assert len(storage.read('articles')) == 6
+
+    # Rows read while the bucket is written are not cached
+    storage = Storage(engine=engine, prefix='test_cache_', cache_size=10 ** 6)
+    writes = [['7', '', 'Tax', 'True', '1']]
+    def write_concurrently(connection, cursor, statement, *args):
+        if writes and statement.startswith('SELECT'):
+            storage.write('articles', [writes.pop()])
+    sa.event.listen(engine, 'before_cursor_execute', write_concurrently)
+    assert len(storage.read('articles')) == 7
+    sa.event.remove(engine, 'before_cursor_execute', write_concurrently)
+    Storage(engine=engine, prefix='test_cache_').write('articles', [['8', '', 'Tax', 'True', '1']])
+    assert len(storage.read('articles')) == 8
+
+    # Uncommitted rows of a session are not cached
+    with pytest.raises(RuntimeError):
+        with storage.session() as session:
+            session.write('articles', [['9', '', 'Tax', 'True', '1']])
+            assert len(session.read('articles')) == 9
+            executor = ThreadPoolExecutor(max_workers=1)
+            assert len(executor.submit(storage.read, 'articles').result()) == 8
+            executor.shutdown()
+            raise RuntimeError('error')
+    assert len(storage.read('articles')) == 8
+
+    # Nested values are not shared with the cache
+    storage.create('compound', COMPOUND['schema'])
+    storage.write('compound', COMPOUND['data'])
+    storage.read('compound')[0][0]['changed'] = True
+    assert storage.read('compound') == cast(COMPOUND)['data']
+
+    # Recreated bucket
+    storage = Storage(engine=engine, prefix='test_cache_', cache_size=10 ** 6)
+    assert len(storage.read('articles')) == 8
+    storage.create('articles', remove_fk(ARTICLES['schema']), force=True)
+    assert storage.read('articles') == []
+
+    # Wrong arguments
+    with pytest.raises(tableschema.exceptions.StorageError):
+        storage.read('articles', fields=['missing'])
+    with pytest.raises(tableschema.exceptions.StorageError):
+        Storage(engine=engine, cache_size=10 ** 6, cache_check='bad')
+
+
+@pytest.mark.parametrize('dialect, database_url', [
+    ('postgresql', os.environ['POSTGRES_URL']),
+    ('sqlite', os.environ['SQLITE_URL']),
+])
+def test_storage_write_results(dialect, database_url):
+    RESOURCE = {
+        'schema': {
+            'fields': [
+                {'name': 'person_id', 'type': 'integer'},
+                {'name': 'name', 'type': 'string'},
+            ],
+        },
+        'data': [['1', 'ulysses'], ['2', 'theseus'], ['3', 'perseus']],
+        'updateData': [['3', 'dedalus'], ['4', 'zeus'], ['5', 'apollo']],
+    }
+
+    # Create storage
+    engine = create_engine(database_url)
+    storage = Storage(engine=engine, prefix='test_storage_results_', autoincrement='__id')
+    storage.create('persons', RESOURCE['schema'], force=True)
+
+    # Write data (counts)
+    counts = storage.write('persons', RESOURCE['data'], results='counts')
+    assert counts == (3, 0, 0)
+
+    # Write data (batches)
+    gen = storage.write('persons', RESOURCE['updateData'], update_keys=['person_id'],
+        as_generator=True, results='batches', buffer_size=0)
+    batches = list(gen)
+    assert [(batch.inserted, batch.updated) for batch in batches] == [(1, 1), (1, 0)]
+    if dialect == 'postgresql':
+        assert [list(batch.ids) for batch in batches] == [[4], [5]]
+    else:
+        assert [batch.ids for batch in batches] == [None, None]
+
+    # Write data (none)
+    assert storage.write('persons', RESOURCE['data'], results='none') is None
+    assert len(storage.read('persons')) == 8
+
+    # Not supported mode
+    with pytest.raises(tableschema.exceptions.StorageError):
+        storage.write('persons', RESOURCE['data'], results='bad')
+
+
 def test_storage_bad_type():
     RESOURCE = {
         'schema': {
@@ -644,6 +1671,72 @@ def test_indexes_fields(dialect, database_url):
     assert indexes
 
 
+@pytest.mark.parametrize('dialect, database_url', [
+    ('postgresql', os.environ['POSTGRES_URL']),
+    ('sqlite', os.environ['SQLITE_URL']),
+])
+def test_indexes_definitions(dialect, database_url):
+    engine = create_engine(database_url)
+    storage = Storage(engine=engine, prefix='test_indexes_definitions_')
+    storage.delete()
+    descriptor = {
+        'fields': [
+            {'name': 'id', 'type': 'integer'},
+            {'name': 'status', 'type': 'string'},
+            {'name': 'created', 'type': 'datetime'},
+            {'name': 'data', 'type': 'object'},
+        ],
+    }
+    indexes_fields = [
+        ['status'],
+        {'fields': ['id'], 'name': 'active_id', 'unique': True, 'where': "status = 'active'"},
+    ]
+    if dialect == 'postgresql':
+        indexes_fields.extend([
+            {'fields': ['data'], 'name': 'data_gin', 'using': 'gin'},
+            {'fields': ['created'], 'name': 'created_brin', 'using': 'brin'},
+            {'fields': ['status'], 'name': 'status_covering', 'include': ['created']},
+        ])
+    storage.create('events', descriptor, indexes_fields=indexes_fields)
+    storage.write('events', [
+        [1, 'active', '2015-01-01T03:00:00Z', '{}'],
+        [1, 'closed', '2015-01-01T03:00:00Z', '{}'],
+    ])
+
+    # Unique partial index
+    with pytest.raises(sa.exc.IntegrityError):
+        storage.write('events', [[1, 'active', '2015-01-01T03:00:00Z', '{}']])
+
+    # Reflection
+    storage = Storage(engine=engine, prefix='test_indexes_definitions_')
+    indexes = {index.pop('name'): index for index in storage.indexes('events')}
+    assert indexes['test_indexes_definitions_events_ix000'] == {'fields': ['status']}
+    assert indexes['active_id']['unique'] is True
+    assert "'active'" in indexes['active_id']['where']
+    if dialect == 'postgresql':
+        assert indexes['data_gin'] == {'fields': ['data'], 'using': 'gin'}
+        assert indexes['created_brin'] == {'fields': ['created'], 'using': 'brin'}
+        assert indexes['status_covering'] == {'fields': ['status'], 'include': ['created']}
+
+    # Bad definition
+    with pytest.raises(tableschema.exceptions.StorageError):
+        storage.create('bad', descriptor, indexes_fields=[{'fields': ['id'], 'bad': True}])
+
+    storage.delete()
+
+
+def test_storage_import_time():
+    # Budget in microseconds for the storage module and its own submodules
+    # (self times, so sqlalchemy and tableschema are not counted)
+    times = get_import_times('tableschema_sql.storage')
+    assert sum(time for name, time in times.items()
+        if name.startswith('tableschema_sql')) < 50000
+
+    # Dialect types and the bloom filter are imported on first use
+    assert 'sqlalchemy.dialects.postgresql' not in times
+    assert 'pybloom_live' not in times
+
+
 # Helpers
 
 def cast(resource, skip=[]):
@@ -659,3 +1752,15 @@ def remove_fk(schema):
     schema = deepcopy(schema)
     del schema['foreignKeys']
     return schema
+
+def get_import_times(module):
+    output = subprocess.check_output(
+        [sys.executable, '-X', 'importtime', '-c', 'import %s' % module],
+        stderr=subprocess.STDOUT).decode('utf-8')
+    # Self times in microseconds (the first column)
+    times = {}
+    for line in output.splitlines():
+        parts = line.split('|')
+        if line.startswith('import time:') and parts[1].strip().isdigit():
+            times.setdefault(parts[2].strip(), int(parts[0].split(':')[1]))
+    return times